@@ -0,0 +1,109 @@
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+from timeit import default_timer as timer
+
+import parsers
+import utils
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--bench', choices=['all', 'set_to_df', 'parsers'], default='all')
+parser.add_argument('--sizes', default='1000, 10000, 100000', type=str)
+parser.add_argument('--reviews_per_object', default=20, type=int)
+parser.add_argument('--fixtures_dir', default='fixtures', type=str)
+parser.add_argument('--repeat', default=200, type=int)
+parser.add_argument('--baseline', default='', type=str)
+parser.add_argument('--save_baseline', default='', type=str)
+parser.add_argument('--tolerance', default=0.2, type=float)
+
+PROFILE_INFO_DICT = {'cdt_id_name': utils.COMPLIMENT_IDS, 'about_me': utils.ABOUT_ME_TITLES}
+
+def make_profile(userid):
+    return [userid] + [random.randint(0, 500) for _ in range(len(utils.PROFILE_COLUMNS) - 1)]
+
+def make_reviews(yelpid, review_num):
+    return [[yelpid] * review_num] + \
+           [[random.randint(0, 500) for _ in range(review_num)] for _ in range(len(utils.REVIEW_COLUMNS) - 1)]
+
+def bench_set_to_df(sizes, reviews_per_object):
+    # Time per object should stay flat as the number of objects grows.
+    print('{:>8} {:>10} {:>12} {:>14}'.format('mode', 'objects', 'seconds', 'us/object'))
+    for mode in ['profile', 'review']:
+        for size in sizes:
+            if mode == 'profile':
+                _set = {i: make_profile('user' + str(i)) for i in range(size)}
+            else:
+                _set = {i: make_reviews('biz' + str(i), reviews_per_object) for i in range(size)}
+            start = timer()
+            utils.set_to_df(_set, mode)
+            elapsed = timer() - start
+            print('{:>8} {:>10} {:>12.3f} {:>14.2f}'.format(mode, size, elapsed, elapsed / size * 1e6))
+
+def load_fixtures(fixtures_dir):
+    # Every recorded review page (<fixtures>/biz) and profile page (<fixtures>/user_details).
+    review_pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, 'biz', '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            review_pages.append((os.path.basename(path), f.read()))
+    profile_pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, 'user_details', '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            profile_pages.append((os.path.basename(path)[:-len('.html')], f.read()))
+    return review_pages, profile_pages
+
+def bench_parsers(fixtures_dir, repeat):
+    # Parse throughput of the extraction logic alone: no network, no sleeps, no browser.
+    review_pages, profile_pages = load_fixtures(fixtures_dir)
+    results = {}
+    print('{:>8} {:>10} {:>12} {:>14}'.format('page', 'objects', 'seconds', 'objects/sec'))
+    if len(review_pages) > 0:
+        review_num = 0
+        start = timer()
+        for _ in range(repeat):
+            for name, page_source in review_pages:
+                review_num += len(parsers.parse_review_page(page_source, name, name))
+        elapsed = timer() - start
+        results['reviews/sec'] = review_num / elapsed
+        print('{:>8} {:>10} {:>12.3f} {:>14.1f}'.format('review', review_num, elapsed, results['reviews/sec']))
+    if len(profile_pages) > 0:
+        start = timer()
+        for _ in range(repeat):
+            for userid, page_source in profile_pages:
+                parsers.parse_profile_page(page_source, userid, PROFILE_INFO_DICT)
+        elapsed = timer() - start
+        results['profiles/sec'] = repeat * len(profile_pages) / elapsed
+        print('{:>8} {:>10} {:>12.3f} {:>14.1f}'.format('profile', repeat * len(profile_pages), elapsed,
+                                                        results['profiles/sec']))
+    return results
+
+def compare_with_baseline(results, baseline, tolerance):
+    # Returns False if any throughput fell more than tolerance below the baseline.
+    passed = True
+    print('{:>14} {:>12} {:>12} {:>9}'.format('metric', 'baseline', 'current', 'change'))
+    for metric, value in results.items():
+        if metric not in baseline:
+            continue
+        change = value / baseline[metric] - 1
+        regressed = change < -tolerance
+        passed = passed and not regressed
+        print('{:>14} {:>12.1f} {:>12.1f} {:>+8.1%}{}'.format(metric, baseline[metric], value, change,
+                                                             '  REGRESSION' if regressed else ''))
+    return passed
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.bench in ['all', 'set_to_df']:
+        bench_set_to_df([int(size) for size in args.sizes.split(', ')], args.reviews_per_object)
+    if args.bench in ['all', 'parsers']:
+        results = bench_parsers(args.fixtures_dir, args.repeat)
+        if args.save_baseline != '':
+            with open(args.save_baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.baseline != '':
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if not compare_with_baseline(results, baseline, args.tolerance):
+                sys.exit(1)
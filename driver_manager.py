@@ -0,0 +1,106 @@
+import atexit
+
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+class DriverManager:
+    # Owns one driver: creates it lazily through factory, counts the pages it loads, replaces it
+    # when it is unhealthy, has loaded max_pages pages or its browser uses more than max_rss_mb,
+    # and always quits it (also at interpreter exit) so no browser process is left behind.
+    # With a page_cache, every loaded page is also written to the cache.
+    def __init__(self, factory, logger, max_pages=0, max_rss_mb=0, page_cache=None):
+        self.factory = factory
+        self.logger = logger
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.page_cache = page_cache
+        self.driver = None
+        self.page_count = 0
+        atexit.register(self.quit)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.quit()
+        atexit.unregister(self.quit)
+
+    def get(self):
+        if self.driver is None:
+            self.driver = self.factory()
+            self.page_count = 0
+        return self.driver
+
+    def load(self, url):
+        driver = self.get()
+        driver.get(url)
+        self.page_count += 1
+        if self.page_cache is not None:
+            self.page_cache.put(url, driver.page_source)
+
+    def healthy(self):
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def rss_mb(self):
+        # Resident memory of the driver service and every browser process it has started.
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        if psutil is None or process is None:
+            return 0
+        try:
+            root = psutil.Process(process.pid)
+            return sum([p.memory_info().rss for p in [root] + root.children(recursive=True)]) / 1024 / 1024
+        except psutil.Error:
+            return 0
+
+    def checkpoint(self):
+        # Called between objects, where replacing the driver cannot invalidate any element handle.
+        if self.driver is None:
+            return
+        if not self.healthy():
+            self.logger.warning('The webdriver does not respond. Recycling...')
+            self.recycle()
+        elif self.max_pages > 0 and self.page_count >= self.max_pages:
+            self.logger.info('The webdriver has loaded {} pages. Recycling...'.format(self.page_count))
+            self.recycle()
+        elif self.max_rss_mb > 0:
+            rss_mb = self.rss_mb()
+            if rss_mb > self.max_rss_mb:
+                self.logger.info('The browser uses {:.0f} MB. Recycling...'.format(rss_mb))
+                self.recycle()
+
+    def recycle(self):
+        self.quit()
+        return self.get()
+
+    def quit(self):
+        if self.driver is None:
+            return
+        driver = self.driver
+        self.driver = None
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+        children = []
+        if psutil is not None and process is not None:
+            try:
+                children = psutil.Process(process.pid).children(recursive=True)
+            except psutil.Error:
+                pass
+        try:
+            driver.quit()
+        except Exception as e:
+            self.logger.warning('Failed to quit the webdriver cleanly: {}'.format(e))
+        # Browser processes that outlived quit() would otherwise pile up as zombies.
+        for child in children:
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from urllib.parse import urljoin
+
+import aiohttp
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+
+import parsers
+
+# What a failed HTTP fetch raises besides TimeoutException and BlockedResponseError.
+FETCH_ERRORS = (aiohttp.ClientError,)
+
+# Rate limiting and bot walls.
+BLOCKED_STATUSES = (403, 429)
+# Yelp answers a removed business or user with 404 and an error page the scrapers recognise.
+PAGE_STATUSES = (404, 410)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/118.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+class SnapshotElement:
+    # The subset of selenium's WebElement the scrapers use, backed by an lxml element.
+    def __init__(self, element, base_url=''):
+        self.element = element
+        self.base_url = base_url
+
+    @property
+    def text(self):
+        return parsers.element_text(self.element)
+
+    def get_attribute(self, name):
+        # Like a browser, report links resolved against the page URL; XPath still sees the raw markup.
+        value = self.element.get(name)
+        if name in ['href', 'src'] and value is not None:
+            return urljoin(self.base_url, value)
+        return value
+
+    def find_elements(self, by, value):
+        if by != By.XPATH:
+            raise ValueError('Only XPath locators are supported on a page snapshot.')
+        return [SnapshotElement(element, self.base_url) for element in self.element.xpath(value)]
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if len(found) == 0:
+            raise NoSuchElementException('Unable to locate element: ' + value)
+        return found[0]
+
+    def click(self):
+        # The whole markup is already in the snapshot; there is nothing to expand.
+        pass
+
+class SnapshotDriver:
+    # The subset of selenium's WebDriver the scrapers use, answering from the last loaded HTML.
+    def __init__(self):
+        self.current_url = ''
+        self.page_source = '<html></html>'
+        self.page_load_timeout = 10
+        self.root = SnapshotElement(parsers.load_snapshot(self.page_source))
+
+    def load(self, url, page_source):
+        self.current_url = url
+        self.page_source = page_source
+        self.root = SnapshotElement(parsers.load_snapshot(page_source), url)
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def find_elements(self, by, value):
+        return self.root.find_elements(by, value)
+
+    def find_element(self, by, value):
+        return self.root.find_element(by, value)
+
+    def quit(self):
+        pass
+
+class BlockedResponseError(Exception):
+    def __init__(self, url, status):
+        super().__init__('HTTP {} for {}'.format(status, url))
+        self.status = status
+
+class PageNotCachedError(Exception):
+    def __init__(self, url):
+        super().__init__('The page cache has no copy of ' + url)
+
+class ReplayDriver(SnapshotDriver):
+    # Serves every page from a page_cache.PageCache and never touches the network.
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    def get(self, url):
+        page_source = self.cache.get(url)
+        if page_source is None:
+            raise PageNotCachedError(url)
+        self.load(url, page_source)
+
+class HttpDriver(SnapshotDriver):
+    # Fetches server-rendered pages over a pooled keep-alive HTTP client instead of a browser.
+    # The asyncio loop runs in a background thread so the scrapers can keep calling get().
+    def __init__(self, pool_size=10, timeout=10):
+        super().__init__()
+        self.page_load_timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = self._run(self._create_session(pool_size))
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _create_session(self, pool_size):
+        connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+        return aiohttp.ClientSession(connector=connector, headers=HEADERS)
+
+    async def _fetch(self, url):
+        timeout = aiohttp.ClientTimeout(total=self.page_load_timeout)
+        async with self.session.get(url, timeout=timeout) as response:
+            # An error body must not be parsed or cached as the page.
+            if response.status in BLOCKED_STATUSES:
+                raise BlockedResponseError(url, response.status)
+            if response.status >= 400 and response.status not in PAGE_STATUSES:
+                response.raise_for_status()
+            return str(response.url), await response.text()
+
+    def get(self, url):
+        try:
+            final_url, page_source = self._run(self._fetch(url))
+        except asyncio.TimeoutError:
+            raise TimeoutException('Timed out loading ' + url)
+        self.load(final_url, page_source)
+
+    def quit(self):
+        if self.loop.is_running():
+            self._run(self.session.close())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
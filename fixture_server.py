@@ -0,0 +1,65 @@
+import argparse
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# A local stand-in for www.yelp.com serving recorded pages from a fixture directory:
+#   /biz/<yelpid>                  -> <fixtures>/biz/<yelpid>.html
+#   /biz/<yelpid>?start=<n>        -> <fixtures>/biz/<yelpid>_start_<n>.html
+#   /user_details?userid=<userid>  -> <fixtures>/user_details/<userid>.html
+# Run the scraper against it with --fetch_engine http --base_url http://127.0.0.1:<port>.
+
+NOT_FOUND_PAGE = '<html><body><h1>We’re sorry. Something went wrong on this page.</h1></body></html>'
+
+def fixture_path(fixtures_dir, path):
+    url = urlsplit(path)
+    query = parse_qs(url.query)
+    if url.path.startswith('/biz/'):
+        name = url.path[len('/biz/'):]
+        if 'start' in query and query['start'][0] != '0':
+            name = name + '_start_' + query['start'][0]
+        return os.path.join(fixtures_dir, 'biz', name + '.html')
+    if url.path == '/user_details' and 'userid' in query:
+        return os.path.join(fixtures_dir, 'user_details', query['userid'][0] + '.html')
+    return None
+
+def make_handler(fixtures_dir):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            path = fixture_path(fixtures_dir, self.path)
+            if path is not None and os.path.exists(path):
+                status = 200
+                with open(path, 'rb') as f:
+                    body = f.read()
+            else:
+                status = 404
+                body = NOT_FOUND_PAGE.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+def start_server(fixtures_dir='fixtures', port=0):
+    # Starts the server in a background thread. Returns the server; server.server_port holds the port.
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fixtures_dir))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures_dir', default='fixtures', type=str)
+    parser.add_argument('--port', default=8080, type=int)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.fixtures_dir))
+    print('Serving ' + args.fixtures_dir + ' on http://127.0.0.1:' + str(args.port))
+    server.serve_forever()
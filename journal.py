@@ -0,0 +1,46 @@
+import json
+import sqlite3
+import time
+
+DONE = 'done'
+FAILED = 'failed'
+DELETED = 'deleted'
+
+class ProgressJournal:
+    # Durable per-run progress: the state of every index and, for review mode, the
+    # records of every finished page of a business so a restart can resume mid-business.
+    def __init__(self, path, run_key):
+        self.run_key = run_key
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS objects (run_key TEXT, idx INTEGER, state TEXT, '
+                          'updated_at REAL, PRIMARY KEY (run_key, idx))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages (run_key TEXT, idx INTEGER, page TEXT, '
+                          'records TEXT, PRIMARY KEY (run_key, idx, page))')
+        self.conn.commit()
+
+    def mark(self, indices, state):
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)',
+                                  [(self.run_key, int(index), state, time.time()) for index in indices])
+            if state == DONE:
+                self.conn.executemany('DELETE FROM pages WHERE run_key = ? AND idx = ?',
+                                      [(self.run_key, int(index)) for index in indices])
+
+    def states(self):
+        rows = self.conn.execute('SELECT idx, state FROM objects WHERE run_key = ?', (self.run_key,))
+        return {index: state for index, state in rows}
+
+    def save_page(self, index, page, records):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                              (self.run_key, int(index), page, json.dumps(records)))
+
+    def load_pages(self, index):
+        rows = self.conn.execute('SELECT page, records FROM pages WHERE run_key = ? AND idx = ?',
+                                 (self.run_key, int(index)))
+        return {page: json.loads(records) for page, records in rows}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,338 @@
+import socket
+import sqlite3
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# A work queue shared by every node of a run. A node leases a batch of tasks for lease_seconds
+# and keeps extending the lease with heartbeats while it works. A node that dies stops sending
+# heartbeats, so its leases expire and another node gets them.
+#
+# Two stores offer the same calls (see open_queue()):
+#   LeaseQueue       a SQLite file. It needs working SQLite locks and, in WAL mode, shared memory
+#                    between the nodes, so it only serves nodes on one host (and the tests);
+#                    locking over network filesystems (NFS, EFS) is unreliable.
+#   RedisLeaseQueue  a Redis server every node can reach, for nodes on several hosts.
+#
+# A task is a whole target. The ?start= pages of a big business are not leased separately,
+# since their results would have to be merged across nodes; one node scrapes every page.
+
+PENDING = 'pending'
+LEASED = 'leased'
+# Final states use the values of journal.py.
+FAILED = 'failed'
+
+# What a failed queue call raises, whichever the store.
+QUEUE_ERRORS = (sqlite3.Error,) + ((redis.RedisError,) if redis is not None else ())
+
+def node_id():
+    # Stays the same when the scraper is restarted on the host, so the node finds its leases again.
+    return socket.gethostname()
+
+def open_queue(location, queue_name, owner=None, lease_seconds=600, max_attempts=3):
+    # location: a redis:// (or rediss://) URL, or the path of a SQLite file.
+    if location.startswith('redis://') or location.startswith('rediss://'):
+        return RedisLeaseQueue(redis.Redis.from_url(location), queue_name, owner, lease_seconds, max_attempts)
+    return LeaseQueue(location, queue_name, owner, lease_seconds, max_attempts)
+
+class LeaseQueue:
+    def __init__(self, path, queue_name, owner=None, lease_seconds=600, max_attempts=3):
+        self.path = path
+        self.queue_name = queue_name
+        self.owner = owner if owner is not None else node_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE, which
+        # takes the write lock up front so two nodes cannot lease the same task.
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS tasks (queue TEXT, task TEXT, state TEXT, owner TEXT, '
+                          'lease_until REAL, attempts INTEGER, PRIMARY KEY (queue, task))')
+        self.heartbeat_stop = None
+        self.reissued_num = 0
+
+    def _transaction(self, action):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = action()
+            self.conn.execute('COMMIT')
+            return result
+        except:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def populate(self, tasks):
+        # Adds the tasks that are not in the queue yet; every node can call this with the same list.
+        self._transaction(lambda: self.conn.executemany(
+            'INSERT OR IGNORE INTO tasks VALUES (?, ?, ?, NULL, 0, 0)',
+            [(self.queue_name, str(task), PENDING) for task in tasks]))
+
+    def lease(self, batch_size):
+        # Returns up to batch_size pending tasks that are due, or tasks whose lease has expired, now
+        # leased to this node.
+        def action():
+            now = time.time()
+            # A task whose every lease has expired keeps killing its nodes; give up on it.
+            self.conn.execute('UPDATE tasks SET state = ?, owner = NULL WHERE queue = ? AND state = ? AND '
+                              'lease_until < ? AND attempts >= ?',
+                              (FAILED, self.queue_name, LEASED, now, self.max_attempts))
+            rows = self.conn.execute('SELECT task, state FROM tasks WHERE queue = ? AND '
+                                     '((state = ? AND lease_until <= ?) OR (state = ? AND lease_until < ?)) '
+                                     'ORDER BY attempts, rowid LIMIT ?',
+                                     (self.queue_name, PENDING, now, LEASED, now, batch_size)).fetchall()
+            self.conn.executemany('UPDATE tasks SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1 '
+                                  'WHERE queue = ? AND task = ?',
+                                  [(LEASED, self.owner, now + self.lease_seconds, self.queue_name, task)
+                                   for task, _ in rows])
+            return rows
+        rows = self._transaction(action)
+        self.reissued_num = len([task for task, state in rows if state == LEASED])
+        return [task for task, _ in rows]
+
+    def heartbeat(self):
+        # Extends every lease this node holds. Returns the number of leases extended.
+        return self._transaction(lambda: self.conn.execute(
+            'UPDATE tasks SET lease_until = ? WHERE queue = ? AND state = ? AND owner = ?',
+            (time.time() + self.lease_seconds, self.queue_name, LEASED, self.owner)).rowcount)
+
+    def complete(self, tasks, state):
+        # Records the final state (e.g. journal.DONE) of tasks this node has leased.
+        self._transaction(lambda: self.conn.executemany(
+            'UPDATE tasks SET state = ?, owner = NULL WHERE queue = ? AND task = ? AND owner = ?',
+            [(state, self.queue_name, str(task), self.owner) for task in tasks]))
+
+    def fail(self, task, state=FAILED, delay=0):
+        # Puts a failed task back for any node to retry after delay seconds, until it has been tried
+        # max_attempts times. Returns whether it will be retried. A pending task waiting for its
+        # retry keeps its due time in lease_until.
+        def action():
+            row = self.conn.execute('SELECT attempts FROM tasks WHERE queue = ? AND task = ? AND owner = ?',
+                                    (self.queue_name, str(task), self.owner)).fetchone()
+            if row is None:
+                return False
+            retry = row[0] < self.max_attempts
+            self.conn.execute('UPDATE tasks SET state = ?, owner = NULL, lease_until = ? WHERE queue = ? AND task = ?',
+                              (PENDING if retry else state, time.time() + delay if retry else 0,
+                               self.queue_name, str(task)))
+            return retry
+        return self._transaction(action)
+
+    def release(self):
+        # Hands the leases of this node back, e.g. when it shuts down before finishing them.
+        self._transaction(lambda: self.conn.execute(
+            'UPDATE tasks SET state = ?, owner = NULL, lease_until = 0, attempts = MAX(attempts - 1, 0) '
+            'WHERE queue = ? AND state = ? AND owner = ?', (PENDING, self.queue_name, LEASED, self.owner)))
+
+    def tasks(self):
+        return [row[0] for row in self.conn.execute('SELECT task FROM tasks WHERE queue = ?', (self.queue_name,))]
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM tasks WHERE queue = ? GROUP BY state',
+                                      (self.queue_name,)).fetchall())
+
+    def unfinished_num(self):
+        return self.conn.execute('SELECT COUNT(*) FROM tasks WHERE queue = ? AND state IN (?, ?)',
+                                 (self.queue_name, PENDING, LEASED)).fetchone()[0]
+
+    def start_heartbeat(self, interval, logger=None):
+        # Sends heartbeats from a background thread with its own connection until stop_heartbeat().
+        self.heartbeat_stop = threading.Event()
+        stop = self.heartbeat_stop
+
+        def beat():
+            queue = self.heartbeat_queue()
+            try:
+                while not stop.wait(interval):
+                    try:
+                        queue.heartbeat()
+                    except QUEUE_ERRORS as e:
+                        if logger is not None:
+                            logger.warning('Lease heartbeat failed: {}'.format(e))
+            finally:
+                if queue is not self:
+                    queue.close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        self.heartbeat_thread = thread
+
+    def heartbeat_queue(self):
+        # A SQLite connection stays in its thread; the heartbeat thread opens its own.
+        return LeaseQueue(self.path, self.queue_name, self.owner, self.lease_seconds, self.max_attempts)
+
+    def stop_heartbeat(self):
+        if self.heartbeat_stop is not None:
+            self.heartbeat_stop.set()
+            self.heartbeat_thread.join()
+            self.heartbeat_stop = None
+
+    def close(self):
+        self.stop_heartbeat()
+        self.conn.close()
+
+# Redis keys of a queue, all in one hash slot: state, attempts and owner are hashes by task;
+# due is a sorted set of the pending tasks by the time they may be leased, leased one of the
+# leased tasks by the time their lease expires; owned:<owner> is the set of a node's leases.
+# Every change runs as a Lua script, so it is atomic on the server.
+
+LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local reissued = {}
+for _, task in ipairs(redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', '(' .. ARGV[1])) do
+    redis.call('ZREM', KEYS[5], task)
+    local owner = redis.call('HGET', KEYS[3], task)
+    if owner then
+        redis.call('SREM', KEYS[6] .. owner, task)
+    end
+    redis.call('HDEL', KEYS[3], task)
+    -- A task whose every lease has expired keeps killing its nodes; give up on it.
+    if tonumber(redis.call('HGET', KEYS[2], task)) >= tonumber(ARGV[5]) then
+        redis.call('HSET', KEYS[1], task, ARGV[7])
+    else
+        redis.call('HSET', KEYS[1], task, ARGV[6])
+        redis.call('ZADD', KEYS[4], 0, task)
+        reissued[task] = true
+    end
+end
+local result = {0}
+for _, task in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))) do
+    redis.call('ZREM', KEYS[4], task)
+    redis.call('HSET', KEYS[1], task, ARGV[8])
+    redis.call('HSET', KEYS[3], task, ARGV[3])
+    redis.call('HINCRBY', KEYS[2], task, 1)
+    redis.call('ZADD', KEYS[5], now + tonumber(ARGV[4]), task)
+    redis.call('SADD', KEYS[6] .. ARGV[3], task)
+    if reissued[task] then
+        result[1] = result[1] + 1
+    end
+    table.insert(result, task)
+end
+return result
+"""
+
+HEARTBEAT_SCRIPT = """
+local tasks = redis.call('SMEMBERS', KEYS[6] .. ARGV[1])
+for _, task in ipairs(tasks) do
+    redis.call('ZADD', KEYS[5], 'XX', ARGV[2], task)
+end
+return #tasks
+"""
+
+COMPLETE_SCRIPT = """
+for i = 3, #ARGV do
+    local task = ARGV[i]
+    if redis.call('HGET', KEYS[3], task) == ARGV[1] then
+        redis.call('HSET', KEYS[1], task, ARGV[2])
+        redis.call('HDEL', KEYS[3], task)
+        redis.call('ZREM', KEYS[5], task)
+        redis.call('SREM', KEYS[6] .. ARGV[1], task)
+    end
+end
+return 0
+"""
+
+FAIL_SCRIPT = """
+local task = ARGV[2]
+if redis.call('HGET', KEYS[3], task) ~= ARGV[1] then
+    return 0
+end
+redis.call('HDEL', KEYS[3], task)
+redis.call('ZREM', KEYS[5], task)
+redis.call('SREM', KEYS[6] .. ARGV[1], task)
+if tonumber(redis.call('HGET', KEYS[2], task)) < tonumber(ARGV[4]) then
+    redis.call('HSET', KEYS[1], task, ARGV[6])
+    redis.call('ZADD', KEYS[4], ARGV[5], task)
+    return 1
+end
+redis.call('HSET', KEYS[1], task, ARGV[3])
+return 0
+"""
+
+RELEASE_SCRIPT = """
+for _, task in ipairs(redis.call('SMEMBERS', KEYS[6] .. ARGV[1])) do
+    redis.call('HDEL', KEYS[3], task)
+    redis.call('ZREM', KEYS[5], task)
+    redis.call('HSET', KEYS[1], task, ARGV[2])
+    redis.call('ZADD', KEYS[4], 0, task)
+    if tonumber(redis.call('HGET', KEYS[2], task)) > 0 then
+        redis.call('HINCRBY', KEYS[2], task, -1)
+    end
+end
+redis.call('DEL', KEYS[6] .. ARGV[1])
+return 0
+"""
+
+POPULATE_SCRIPT = """
+for i = 2, #ARGV do
+    if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[1]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[i], 0)
+        redis.call('ZADD', KEYS[4], 0, ARGV[i])
+    end
+end
+return 0
+"""
+
+class RedisLeaseQueue(LeaseQueue):
+    # The calls of LeaseQueue on a Redis server, for nodes on several hosts.
+    def __init__(self, client, queue_name, owner=None, lease_seconds=600, max_attempts=3):
+        self.client = client
+        self.queue_name = queue_name
+        self.owner = owner if owner is not None else node_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        prefix = 'yelp_queue:{' + queue_name + '}:'
+        self.keys = [prefix + name for name in ['state', 'attempts', 'owner', 'due', 'leased', 'owned:']]
+        self.heartbeat_stop = None
+        self.reissued_num = 0
+
+    def _run(self, script, *values):
+        return self.client.eval(script, len(self.keys), *(self.keys + list(values)))
+
+    def populate(self, tasks):
+        tasks = [str(task) for task in tasks]
+        for i in range(0, len(tasks), 1000):
+            self._run(POPULATE_SCRIPT, PENDING, *tasks[i:i + 1000])
+
+    def lease(self, batch_size):
+        result = self._run(LEASE_SCRIPT, time.time(), batch_size, self.owner, self.lease_seconds, self.max_attempts,
+                           PENDING, FAILED, LEASED)
+        self.reissued_num = int(result[0])
+        return [task.decode() for task in result[1:]]
+
+    def heartbeat(self):
+        return self._run(HEARTBEAT_SCRIPT, self.owner, time.time() + self.lease_seconds)
+
+    def complete(self, tasks, state):
+        if len(tasks) > 0:
+            self._run(COMPLETE_SCRIPT, self.owner, state, *[str(task) for task in tasks])
+
+    def fail(self, task, state=FAILED, delay=0):
+        return self._run(FAIL_SCRIPT, self.owner, str(task), state, self.max_attempts, time.time() + delay,
+                         PENDING) == 1
+
+    def release(self):
+        self._run(RELEASE_SCRIPT, self.owner, PENDING)
+
+    def tasks(self):
+        return [task.decode() for task in self.client.hkeys(self.keys[0])]
+
+    def counts(self):
+        counts = {}
+        for state in self.client.hvals(self.keys[0]):
+            counts[state.decode()] = counts.get(state.decode(), 0) + 1
+        return counts
+
+    def unfinished_num(self):
+        return self.client.zcard(self.keys[3]) + self.client.zcard(self.keys[4])
+
+    def heartbeat_queue(self):
+        # The client is thread-safe.
+        return self
+
+    def close(self):
+        self.stop_heartbeat()
+        self.client.close()
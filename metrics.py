@@ -0,0 +1,84 @@
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from timeit import default_timer as timer
+
+# Upper bounds (seconds) of the histogram buckets, Prometheus style: each bucket counts every
+# observation up to its bound.
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf]
+
+class StageMetrics:
+    # Time spent per stage (fetch, sleep, click, extract, build, ...) as count/sum/max and a histogram.
+    # Stages nest: the time of an inner stage is not counted again in the stage around it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        frame = [timer(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = timer() - frame[0]
+            if len(stack) > 0:
+                stack[-1][1] += elapsed
+            self.observe(name, elapsed - frame[1])
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(BUCKETS)}
+            stage = self.stages[name]
+            stage['count'] += 1
+            stage['sum'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stage['buckets'][i] += 1
+
+    def merge(self, other):
+        with self.lock:
+            for name, theirs in other.snapshot().items():
+                if name not in self.stages:
+                    self.stages[name] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(BUCKETS)}
+                stage = self.stages[name]
+                stage['count'] += theirs['count']
+                stage['sum'] += theirs['sum']
+                stage['max'] = max(stage['max'], theirs['max'])
+                stage['buckets'] = [a + b for a, b in zip(stage['buckets'], theirs['buckets'].values())]
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {'count': stage['count'], 'sum': round(stage['sum'], 6), 'max': round(stage['max'], 6),
+                           'buckets': {('+Inf' if bound == math.inf else str(bound)): n
+                                       for bound, n in zip(BUCKETS, stage['buckets'])}}
+                    for name, stage in self.stages.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+class MetricsWriter:
+    # Appends one JSON object per line. Each line is a single O_APPEND write, so worker processes
+    # can share the file without interleaving their lines.
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, record):
+        record = dict({'time': datetime.now().isoformat(timespec='milliseconds')}, **record)
+        os.write(self.fd, (json.dumps(record) + '\n').encode('utf-8'))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,54 @@
+import random
+import threading
+import time
+
+class RateController:
+    # AIMD pacing of page requests: the delay between requests shrinks by a fixed step after
+    # every clean load and is multiplied on timeouts, empty review sections or robot checks.
+    def __init__(self, logger, min_delay, max_delay, initial_delay, decrease_step=0.5, backoff_factor=2.0,
+                 blocked_factor=4.0, jitter=0.2):
+        self.logger = logger
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min(max(initial_delay, min_delay), max_delay)
+        self.decrease_step = decrease_step
+        self.backoff_factor = backoff_factor
+        self.blocked_factor = blocked_factor
+        self.jitter = jitter
+        self.successes = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Sleeps for the current delay with some jitter and returns the sleep time.
+        with self.lock:
+            sleep_time = self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(sleep_time)
+        return sleep_time
+
+    def _update(self, event, delay):
+        previous_delay = self.delay
+        self.delay = min(max(delay, self.min_delay), self.max_delay)
+        self.logger.info('Pacing [{}]: delay {:.2f}s -> {:.2f}s ({:.3f} req/s, {} ok / {} failed)'.format(
+            event, previous_delay, self.delay, 1 / self.delay if self.delay > 0 else float('inf'),
+            self.successes, self.failures))
+
+    def on_success(self):
+        with self.lock:
+            self.successes += 1
+            self._update('success', self.delay - self.decrease_step)
+
+    def on_timeout(self):
+        with self.lock:
+            self.failures += 1
+            self._update('timeout', max(self.delay, 1) * self.backoff_factor)
+
+    def on_empty(self):
+        with self.lock:
+            self.failures += 1
+            self._update('empty reviews', max(self.delay, 1) * self.backoff_factor)
+
+    def on_blocked(self):
+        with self.lock:
+            self.failures += 1
+            self._update('robot check', max(self.delay, 1) * self.blocked_factor)
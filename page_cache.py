@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Content-addressed store of fetched pages, so a crawl can be parsed again without Yelp:
+#   <cache_dir>/objects/<sha256[:2]>/<sha256>.html.gz   gzip-compressed page source
+#   <cache_dir>/index.db                                 (url, fetched_at) -> sha256
+# Identical pages fetched twice are stored once. Entries older than ttl seconds, then the
+# oldest entries beyond max_size_mb, are evicted on write: at most every EVICT_INTERVAL seconds,
+# or as soon as the running size total of this process goes past max_size_mb.
+
+EVICT_INTERVAL = 60
+# Size eviction goes down to this share of max_size_mb, so the next writes do not evict again.
+LOW_WATER = 0.9
+
+class PageCache:
+    def __init__(self, cache_dir, ttl=0, max_size_mb=0):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size_mb * 1024 * 1024
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        # Page threads share one cache, worker processes open their own.
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT, fetched_at REAL, hash TEXT, size INTEGER, '
+                          'PRIMARY KEY (url, fetched_at))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_hash ON pages (hash)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)')
+        self.conn.commit()
+        # Size of the stored objects, counted again from the index on every eviction; other
+        # processes sharing the cache are only seen then.
+        self.total_size = 0
+        self.next_evict = 0
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest + '.html.gz')
+
+    def put(self, url, page_source):
+        data = page_source.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self.lock:
+            new_object = self.conn.execute('SELECT 1 FROM pages WHERE hash = ? LIMIT 1', (digest,)).fetchone() is None
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)', (url, time.time(), digest, size))
+            self.conn.commit()
+            if new_object:
+                self.total_size += size
+            if (self.ttl > 0 or self.max_size > 0) and \
+                    (time.time() >= self.next_evict or (self.max_size > 0 and self.total_size > self.max_size)):
+                self._evict()
+        return digest
+
+    def get(self, url, max_age=0):
+        # The newest page source stored for url (no older than max_age seconds if max_age > 0), or None.
+        with self.lock:
+            row = self.conn.execute('SELECT fetched_at, hash FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1',
+                                    (url,)).fetchone()
+        if row is None or (max_age > 0 and time.time() - row[0] > max_age):
+            return None
+        try:
+            with gzip.open(self._object_path(row[1]), 'rb') as f:
+                return f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def _evict(self):
+        self.next_evict = time.time() + EVICT_INTERVAL
+        removed = []
+        if self.ttl > 0:
+            removed += self._delete_rows('SELECT url, fetched_at, hash FROM pages WHERE fetched_at < ?',
+                                         (time.time() - self.ttl,))
+        if self.max_size > 0:
+            # Sizes are counted per stored object, not per index row.
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM '
+                                      '(SELECT MAX(size) AS size FROM pages GROUP BY hash)').fetchone()[0]
+            if total > self.max_size:
+                target = self.max_size * LOW_WATER
+                while total > target:
+                    rows = self.conn.execute('SELECT url, fetched_at, hash, size FROM pages '
+                                             'ORDER BY fetched_at LIMIT 100').fetchall()
+                    if len(rows) == 0:
+                        break
+                    for url, fetched_at, digest, size in rows:
+                        if total <= target:
+                            break
+                        self.conn.execute('DELETE FROM pages WHERE url = ? AND fetched_at = ?', (url, fetched_at))
+                        if self.conn.execute('SELECT 1 FROM pages WHERE hash = ? LIMIT 1', (digest,)).fetchone() is None:
+                            total -= size
+                        removed.append(digest)
+            self.total_size = total
+        self.conn.commit()
+        for digest in set(removed):
+            if self.conn.execute('SELECT 1 FROM pages WHERE hash = ? LIMIT 1', (digest,)).fetchone() is None:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    def _delete_rows(self, query, params):
+        rows = self.conn.execute(query, params).fetchall()
+        self.conn.executemany('DELETE FROM pages WHERE url = ? AND fetched_at = ?', [(r[0], r[1]) for r in rows])
+        return [r[2] for r in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
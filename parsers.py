@@ -0,0 +1,335 @@
+import re
+
+from lxml import etree
+from lxml import html as lxml_html
+
+class MissingElementError(Exception):
+    def __init__(self, xpath):
+        super().__init__('Cannot find the element in the page snapshot: ' + xpath)
+
+def _xpath(path):
+    return etree.XPath(path)
+
+# Review page
+RECOMMENDED_REVIEWS = _xpath('.//section[@aria-label="Recommended Reviews"]')
+REVIEW_ITEMS = _xpath('./div[2]/ul/li')
+PAGINATION = _xpath('.//div[@aria-label="Pagination navigation"]')
+PAGINATION_TEXT = _xpath('./div[2]/span')
+ROBOT_CHECK = _xpath('.//h2[contains(text(), "Hey there! Before you continue")]')
+
+USER_INFO = _xpath('.//div[contains(@class, "user-passport-info")]')
+USER_LINK = _xpath('./span/a')
+ELITE_BADGE = _xpath('.//div[contains(@class, "elite-badge")]')
+ELITE_USER_LOC = _xpath('./div[2]/div/span')
+USER_LOC = _xpath('./div/div/span')
+FIRST_REVIEW = _xpath('.//span[contains(text(), "First to Review")]')
+PASSPORT_STAT = _xpath('.//div[contains(@class, "user-passport-stat")]')
+CHILD_DIVS = _xpath('./div')
+STAT_VALUE = _xpath('./span[2]/span')
+STAR_RATING = _xpath('.//div[contains(@aria-label, "star rating")]')
+DATE_CONTAINER = _xpath('../../following-sibling::div[1]')
+SPAN = _xpath('./span')
+UPDATED_REVIEW = _xpath('.//span[contains(text(), "Updated review")]')
+POSTED_PHOTOS = _xpath('.//a[contains(@href, "biz_photos")]')
+CHECK_INS = _xpath('.//span[text()="check-ins"]')
+COMMENTS = _xpath('.//p[contains(@class, "comment")]')
+HELPFUL = _xpath('.//div[contains(@aria-label, "Helpful")]')
+THANKS = _xpath('.//div[contains(@aria-label, "Thanks")]')
+LOVE_THIS = _xpath('.//div[contains(@aria-label, "Love this")]')
+OH_NO = _xpath('.//div[contains(@aria-label, "Oh no")]')
+BUSINESS_OWNER = _xpath('.//div[contains(@aria-labelledby, "businessOwner")]')
+OWNER_COMMENT_DATE = _xpath('./preceding-sibling::div/p')
+PREVIOUS_RATING_AND_DATE = _xpath('../../../../preceding-sibling::div[1]/div[1]/div/div')
+PREVIOUS_RATING = _xpath('./div[1]/span/div')
+PREVIOUS_DATE = _xpath('./div[2]/span[1]')
+NEXT_DIV = _xpath('../following-sibling::div[1]')
+HELPFUL_LABEL = _xpath('.//span[contains(text(), "Helpful")]')
+PREVIOUS_REACTIONS_1 = _xpath('../following-sibling::div[1]/div/div/div')
+PREVIOUS_REACTIONS_2 = _xpath('../following-sibling::div[2]/div/div/div')
+DIV = _xpath('./div')
+
+def load_snapshot(page_source):
+    tree = lxml_html.fromstring(page_source)
+    # WebElement.text renders <br> as a line break; keep that for text_content().
+    for br in tree.iter('br'):
+        br.tail = '\n' + (br.tail or '')
+    return tree
+
+def element_text(element):
+    # Mimics WebElement.text: collapse whitespace within a line, drop empty lines.
+    lines = [re.sub(r'[ \t\r\f\v\xa0]+', ' ', line).strip() for line in element.text_content().split('\n')]
+    return '\n'.join([line for line in lines if line != ''])
+
+def _first(element, xpath):
+    found = xpath(element)
+    if len(found) == 0:
+        raise MissingElementError(xpath.path)
+    return found[0]
+
+def _digits(value):
+    return re.sub(r'[^0-9]', '', value)
+
+def is_detected_as_robot(tree):
+    return len(ROBOT_CHECK(tree)) > 0
+
+def parse_pagination(tree):
+    # Returns (current page, total page) or None if the navigator is missing.
+    navigation_elements = PAGINATION(tree)
+    if len(navigation_elements) == 0:
+        return None
+    page_text = element_text(_first(navigation_elements[0], PAGINATION_TEXT)).split('of')
+    return int(page_text[0]), int(page_text[1])
+
+def find_review_elements(tree):
+    # Returns None if the "Recommended Reviews" section is missing.
+    review_sections = RECOMMENDED_REVIEWS(tree)
+    if len(review_sections) == 0:
+        return None
+    return REVIEW_ITEMS(review_sections[0])
+
+def parse_review_element(review_element, yelpid, yelp_name):
+    user_info_element = _first(review_element, USER_INFO)
+    user_link_element = _first(user_info_element, USER_LINK)
+    user_name = element_text(user_link_element)
+    user_id = user_link_element.get('href').split('?')[1].replace('userid=', '')
+    if len(ELITE_BADGE(user_info_element)) > 0:
+        user_elite = 1
+        user_loc_element = ELITE_USER_LOC(user_info_element)
+    else:
+        user_elite = 0
+        user_loc_element = USER_LOC(user_info_element)
+    user_loc = element_text(user_loc_element[0]) if len(user_loc_element) > 0 else ''
+    user_first_review = 1 if len(FIRST_REVIEW(review_element)) > 0 else 0
+
+    # User Passport Stat
+    passport_stat = {}
+    passport_stat['Friends'] = 0
+    passport_stat['Reviews'] = 0
+    passport_stat['Photos'] = 0
+    for stat_element in CHILD_DIVS(_first(review_element, PASSPORT_STAT)):
+        passport_stat[stat_element.get('aria-label')] = int(element_text(_first(stat_element, STAT_VALUE)))
+
+    rating_and_date_element = _first(review_element, STAR_RATING)
+    rating = int(rating_and_date_element.get('aria-label').split(' ')[0])
+    date = element_text(_first(_first(rating_and_date_element, DATE_CONTAINER), SPAN))
+
+    user_review_updated = 1 if len(UPDATED_REVIEW(review_element)) > 0 else 0
+
+    user_num_posted_photo = 0
+    user_num_posted_photo_elements = POSTED_PHOTOS(review_element)
+    if len(user_num_posted_photo_elements) > 0:
+        posted_photo_text = element_text(user_num_posted_photo_elements[0])
+        if posted_photo_text.find('See all photos from') == -1:
+            user_num_posted_photo = int(_digits(posted_photo_text))
+
+    user_num_check_ins = 0
+    user_num_check_ins_element = CHECK_INS(review_element)
+    if len(user_num_check_ins_element) > 0:
+        user_num_check_ins = int(_digits(element_text(user_num_check_ins_element[0])))
+
+    comment_elements = COMMENTS(review_element)
+    comment_elements.reverse()
+    # first comment element is this reviewer's comment.
+    comment = element_text(_first(comment_elements.pop(), SPAN))
+
+    helpful = int(_digits(_first(review_element, HELPFUL).get('aria-label')))
+    thanks = int(_digits(_first(review_element, THANKS).get('aria-label')))
+    love_this = int(_digits(_first(review_element, LOVE_THIS).get('aria-label')))
+    oh_no = int(_digits(_first(review_element, OH_NO).get('aria-label')))
+
+    owner_comment = ''
+    owner_comment_date = ''
+    previous_rating_list = []
+    previous_dates_list = []
+    previous_comment_list = []
+    previous_helpful_list = []
+    previous_thanks_list = []
+    previous_love_this_list = []
+    previous_oh_no_list = []
+    # Second comment element is owner comment if exist
+    if len(comment_elements) > 0 and len(BUSINESS_OWNER(review_element)) > 0:
+        owner_comment_element = comment_elements.pop()
+        owner_comment = element_text(_first(owner_comment_element, SPAN))
+        owner_comment_date = element_text(_first(owner_comment_element, OWNER_COMMENT_DATE))
+
+    for previous_comment_element in comment_elements:
+        previous_rating_and_date_element = _first(previous_comment_element, PREVIOUS_RATING_AND_DATE)
+        if len(HELPFUL_LABEL(_first(previous_comment_element, NEXT_DIV))) > 0:
+            previous_comment_helpfuls = PREVIOUS_REACTIONS_1(previous_comment_element)
+        else:
+            previous_comment_helpfuls = PREVIOUS_REACTIONS_2(previous_comment_element)
+
+        previous_comment_list.append(element_text(_first(previous_comment_element, SPAN)))
+        previous_rating_list.append(_digits(_first(previous_rating_and_date_element, PREVIOUS_RATING).get('aria-label')))
+        previous_dates_list.append(element_text(_first(previous_rating_and_date_element, PREVIOUS_DATE)))
+        previous_helpful_list.append(_digits(_first(previous_comment_helpfuls[0], DIV).get('aria-label')))
+        previous_thanks_list.append(_digits(_first(previous_comment_helpfuls[1], DIV).get('aria-label')))
+        previous_love_this_list.append(_digits(_first(previous_comment_helpfuls[2], DIV).get('aria-label')))
+        previous_oh_no_list.append(_digits(_first(previous_comment_helpfuls[3], DIV).get('aria-label')))
+
+    return [yelpid, yelp_name, user_name, user_id, user_elite, user_first_review, user_loc,
+            passport_stat['Friends'], passport_stat['Reviews'], passport_stat['Photos'],
+            rating, date, user_review_updated, user_num_posted_photo, user_num_check_ins, comment,
+            helpful, thanks, love_this, oh_no, owner_comment_date, owner_comment,
+            ', '.join(previous_rating_list), ', '.join(previous_dates_list), ', '.join(previous_comment_list),
+            ', '.join(previous_helpful_list), ', '.join(previous_thanks_list),
+            ', '.join(previous_love_this_list), ', '.join(previous_oh_no_list)]
+
+def parse_review_page(page_source, yelpid, yelp_name):
+    # Returns one 29-field record per review, or None if the review section is missing.
+    review_elements = find_review_elements(load_snapshot(page_source))
+    if review_elements is None:
+        return None
+    return [parse_review_element(review_element, yelpid, yelp_name) for review_element in review_elements]
+
+# Profile page
+PROFILE_HEADER = _xpath('.//div[@data-testid="profile-header-decoration"]/following-sibling::div[1]')
+PROFILE_PHOTO_LINKS = _xpath('./div[1]/a')
+IMG = _xpath('./img')
+PROFILE_NAME = _xpath('./div[2]/a/h2')
+PROFILE_LOC = _xpath('./div[3]/p')
+PROFILE_PASSPORT_STATS = _xpath('.//div[contains(@class, "user-passport-stats")]')
+PROFILE_STAT = _xpath('./div[@aria-label=$label]')
+ELITE_LINK = _xpath('.//a[@href=$href]')
+ADD_FRIEND = _xpath('.//span[text()="Add friend"]')
+TAGLINE = _xpath('../../preceding-sibling::div[1]/p')
+SECTION_TITLE = _xpath('.//p[text()=$title]')
+REVIEW_REACTION_VALUES = [_xpath('../following-sibling::div/div[1]/div/div[2]/p[2]')] + \
+                         [_xpath('../following-sibling::div[1]/div[' + str(i) + ']/div/div[2]/p[2]') for i in range(2, 5)]
+STAT_VALUES = [_xpath('../following-sibling::div[1]/div[' + str(i) + ']/div/div[2]/p[2]') for i in range(1, 4)]
+COMPLIMENT = _xpath('.//div[@data-testid=$testid]')
+COMPLIMENT_VALUE = _xpath('./div/span[2]/span[2]')
+RATING_BARS = [_xpath('../following-sibling::div[1]/div/div[' + str(i) + ']/div/div[2]/div') for i in range(1, 6)]
+TOP_CATEGORIES = _xpath('../following-sibling::ul/li')
+P = _xpath('./p')
+ME_TITLE = _xpath('.//h3[text()="More about me"]')
+ME_INFO_EXPANDED = _xpath('../following-sibling::div[1]/div/div/div')
+ME_INFO = _xpath('../following-sibling::div[1]/div')
+ME_VALUE = _xpath('./following-sibling::p')
+
+def is_deleted_profile(tree):
+    return len(tree.xpath('.//h1[contains(text(), "We’re sorry. Something went wrong on this page.")]')) > 0
+
+def parse_profile_page(page_source, userid, info_dict, expanded=False):
+    # Returns the 58-field profile row. expanded tells whether "Show more" of "More about me" was clicked.
+    tree = load_snapshot(page_source)
+
+    ## Profile Info
+    profile_header_element = _first(tree, PROFILE_HEADER)
+
+    # 1. Photo
+    profile_photo_url_list = []
+    for photo_element in PROFILE_PHOTO_LINKS(profile_header_element):
+        photo_url = _first(photo_element, IMG).get('src')
+        # No photos
+        if photo_url.find('default_user_avatar') != -1:
+            break
+        profile_photo_url_list.append(photo_url)
+    user_photo_url = ', '.join(profile_photo_url_list)
+
+    # 2. Name, 3. Location
+    user_name_element = PROFILE_NAME(profile_header_element)
+    user_name = element_text(user_name_element[0]) if len(user_name_element) > 0 else ''
+    user_loc_element = PROFILE_LOC(profile_header_element)
+    user_loc = element_text(user_loc_element[0]) if len(user_loc_element) > 0 else ''
+
+    # 4. Passport Stat
+    passport_stat = {'Friends': 0, 'Reviews': 0, 'Photos': 0}
+    user_stat_elements = PROFILE_PASSPORT_STATS(profile_header_element)
+    if len(user_stat_elements) > 0:
+        for label in passport_stat:
+            stat_element = PROFILE_STAT(user_stat_elements[0], label=label)
+            if len(stat_element) > 0:
+                passport_stat[label] = int(element_text(_first(stat_element[0], STAT_VALUE)))
+
+    user_elite_year = 0
+    elite_element = ELITE_LINK(profile_header_element, href='/user_details_years_elite?userid=' + userid)
+    if len(elite_element) > 0:
+        user_elite_year = int(element_text(_first(elite_element[0], SPAN)).split(' ')[1])
+
+    user_tagline = ''
+    user_tagline_element = TAGLINE(_first(profile_header_element, ADD_FRIEND))
+    if len(user_tagline_element) > 0:
+        user_tagline = element_text(user_tagline_element[0])
+
+    # Impact
+    ## Review reactions
+    review_reactions = [0, 0, 0, 0]
+    review_reaction_elements = SECTION_TITLE(tree, title='Review reactions')
+    if len(review_reaction_elements) > 0:
+        for i, value_xpath in enumerate(REVIEW_REACTION_VALUES):
+            value_element = value_xpath(review_reaction_elements[0])
+            if len(value_element) > 0:
+                review_reactions[i] = element_text(value_element[0])
+
+    ## Stats
+    stats = [0, 0, 0]
+    stat_elements = SECTION_TITLE(tree, title='Stats')
+    if len(stat_elements) > 0:
+        for i, value_xpath in enumerate(STAT_VALUES):
+            value_element = value_xpath(stat_elements[0])
+            if len(value_element) > 0:
+                stats[i] = element_text(value_element[0])
+
+    ## Compliments
+    compliments_dict = {}
+    for id_name in info_dict['cdt_id_name']:
+        compliments_dict[id_name] = 0
+    if len(SECTION_TITLE(tree, title='Compliments')) > 0:
+        for id_name in info_dict['cdt_id_name']:
+            this_compliment_element = COMPLIMENT(tree, testid='impact-compliment-' + id_name)
+            if len(this_compliment_element) > 0:
+                compliments_dict[id_name] = int(element_text(_first(this_compliment_element[0], COMPLIMENT_VALUE)))
+
+    # Review Distribution
+    ## Ratings (5 stars to 1 star)
+    ratings = [0, 0, 0, 0, 0]
+    rating_elements = SECTION_TITLE(tree, title='Ratings')
+    if len(rating_elements) > 0:
+        for i, bar_xpath in enumerate(RATING_BARS):
+            bar_element = bar_xpath(rating_elements[0])
+            if len(bar_element) > 0:
+                match = re.search(r'\((.*?)\)', bar_element[0].get('aria-label'))
+                if match:
+                    ratings[i] = int(match.group(1))
+
+    ## Top categories
+    top5_dict = {}
+    child_tc_elements = SECTION_TITLE(tree, title='Top categories')
+    if len(child_tc_elements) > 0:
+        for this_c in TOP_CATEGORIES(child_tc_elements[0]):
+            cat_name_and_num = element_text(_first(this_c, P))
+            match = re.search(r'\((\d+)\)$', cat_name_and_num)
+            if match:
+                top5_dict[re.sub(r'\s*\(\d+\)$', '', cat_name_and_num)] = match.group(1)
+            else:
+                top5_dict['Unknown'] = ''
+    top5 = ['', 0] * 5
+    for i, (key, value) in enumerate(list(top5_dict.items())[:5]):
+        top5[2 * i] = key
+        top5[2 * i + 1] = int(value)
+
+    ## More about me
+    me_dict = {}
+    for me_info in info_dict['about_me']:
+        me_dict[me_info] = ''
+    me_title_element = ME_TITLE(tree)
+    if len(me_title_element) > 0:
+        if expanded:
+            me_info_elements = ME_INFO_EXPANDED(me_title_element[0])
+        else:
+            me_info_elements = ME_INFO(me_title_element[0])
+        if len(me_info_elements) > 0:
+            for me_info in info_dict['about_me']:
+                this_me_info_element = SECTION_TITLE(me_info_elements[0], title=me_info)
+                if len(this_me_info_element) > 0:
+                    me_dict[me_info] = element_text(_first(this_me_info_element[0], ME_VALUE))
+
+    return [userid, user_name, user_loc, user_photo_url,
+            passport_stat['Friends'], passport_stat['Reviews'], passport_stat['Photos'],
+            user_elite_year, user_tagline] + ratings + review_reactions + stats + top5 + \
+           [compliments_dict['thankYou'], compliments_dict['cutePic'], compliments_dict['goodWriter'],
+            compliments_dict['hotStuff'], compliments_dict['justANote'], compliments_dict['ilikeYourProfile'],
+            compliments_dict['writeMore'], compliments_dict['youAreCool'], compliments_dict['greatPhoto'],
+            compliments_dict['greatList'], compliments_dict['youAreFunny']] + \
+           [me_dict[me_info] for me_info in info_dict['about_me']]
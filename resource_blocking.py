@@ -0,0 +1,45 @@
+# URL patterns Chrome should not download while scraping. The scrapers only read text and
+# a few src/href attributes, which stay in the DOM even when the resource itself is blocked.
+
+def _extensions(*extensions):
+    # A URL ending in the extension, or followed by a query string (photo.png?w=300). A bare
+    # '*.ico*' would also catch hosts and paths like static.iconfinder.com.
+    return [pattern for extension in extensions for pattern in ['*.' + extension, '*.' + extension + '?*']]
+
+RESOURCE_TYPE_PATTERNS = {
+    'image': _extensions('png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'avif') +
+             ['*s3-media*.fl.yelpcdn.com/*photo*'],
+    'font': _extensions('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': _extensions('mp4', 'webm', 'm3u8', 'mp3'),
+    # Stylesheets decide what WebElement.text sees, so they are only blocked on request.
+    'stylesheet': _extensions('css'),
+}
+
+THIRD_PARTY_HOSTS = ['googletagmanager.com', 'google-analytics.com', 'doubleclick.net', 'googlesyndication.com',
+                     'googleadservices.com', 'adservice.google.com', 'facebook.net', 'facebook.com/tr',
+                     'amazon-adsystem.com', 'scorecardresearch.com', 'quantserve.com', 'criteo.com',
+                     'criteo.net', 'adnxs.com', 'taboola.com', 'outbrain.com', 'hotjar.com', 'bing.com/bat',
+                     'branch.io', 'optimizely.com', 'newrelic.com', 'nr-data.net', 'sentry.io']
+
+def blocked_url_patterns(resource_types, block_third_party=True):
+    patterns = []
+    for resource_type in resource_types:
+        patterns.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+    if block_third_party:
+        patterns.extend(['*' + host + '*' for host in THIRD_PARTY_HOSTS])
+    return patterns
+
+def chrome_prefs(resource_types):
+    # Content settings Chrome honours before any request is made (2 = block).
+    prefs = {}
+    if 'image' in resource_types:
+        prefs['profile.managed_default_content_settings.images'] = 2
+    prefs['profile.managed_default_content_settings.notifications'] = 2
+    prefs['profile.managed_default_content_settings.geolocation'] = 2
+    prefs['profile.managed_default_content_settings.media_stream'] = 2
+    return prefs
+
+def apply(driver, patterns):
+    # Blocks the patterns for every later request of this driver through the DevTools protocol.
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
@@ -0,0 +1,31 @@
+import collections
+import heapq
+import itertools
+import time
+
+class WorkScheduler:
+    # Hands out target indices in order, each in O(1). A failed index can be put back on a
+    # separate retry queue, ready after a delay; ready retries go before the targets left.
+    def __init__(self, indices):
+        self.pending = collections.deque(indices)
+        # (ready at, order of retry(), index)
+        self.retries = []
+        self.retry_order = itertools.count()
+
+    def __len__(self):
+        return len(self.pending) + len(self.retries)
+
+    def retry(self, index, delay=0):
+        heapq.heappush(self.retries, (time.monotonic() + delay, next(self.retry_order), index))
+
+    def next(self):
+        # Returns the next index or None when every index is done. When only retries are left,
+        # waits for the first one to be ready.
+        if len(self.retries) > 0 and self.retries[0][0] <= time.monotonic():
+            return heapq.heappop(self.retries)[2]
+        if len(self.pending) > 0:
+            return self.pending.popleft()
+        if len(self.retries) > 0:
+            time.sleep(max(self.retries[0][0] - time.monotonic(), 0))
+            return heapq.heappop(self.retries)[2]
+        return None
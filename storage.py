@@ -0,0 +1,243 @@
+import os
+import random
+import shutil
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Where result files and index lists go: the working directory or an S3 bucket. Both backends
+# offer the same calls, so the scraper does not care which one it writes to.
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# What a failed save raises, whichever the backend.
+STORAGE_ERRORS = (BotoCoreError, ClientError, OSError)
+
+def is_retryable(e):
+    # Connection problems, throttling and server errors go away; a missing bucket or a denied
+    # request does not.
+    if isinstance(e, ClientError):
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return status >= 500 or status in [408, 429] or \
+               e.response.get('Error', {}).get('Code') in ['RequestTimeout', 'SlowDown', 'Throttling']
+    return isinstance(e, BotoCoreError)
+
+def retry(action, description, logger=None, max_attempts=5, base_delay=1.0):
+    # Calls action() until it succeeds, backing off exponentially (with jitter) between attempts.
+    attempt = 1
+    while True:
+        try:
+            return action()
+        except (BotoCoreError, ClientError) as e:
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if logger is not None:
+                logger.warning('{} failed ({}). Retrying in {:.1f}s... {}/{}'.format(
+                    description, e, delay, attempt, max_attempts))
+            time.sleep(delay)
+            attempt += 1
+
+class LocalStorage:
+    def __init__(self, root='.'):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def location(self, key):
+        return self.path(key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def list(self, prefix):
+        # The keys under the directory prefix (ending with '/'), sorted.
+        if not os.path.isdir(self.path(prefix)):
+            return []
+        return sorted([prefix + name for name in os.listdir(self.path(prefix)) if not name.endswith('.tmp')])
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+        # Like a prefix on S3, a directory goes away with its last key.
+        if os.path.dirname(key) != '':
+            try:
+                os.rmdir(os.path.dirname(self.path(key)))
+            except OSError:
+                pass
+
+    def abort_uploads(self, prefix):
+        # Removes the temporary files that crashed uploads under prefix left behind.
+        directory = os.path.dirname(self.path(prefix)) or '.'
+        if not os.path.isdir(directory):
+            return 0
+        names = [name for name in os.listdir(directory)
+                 if name.startswith(os.path.basename(prefix)) and name.endswith('.tmp')]
+        for name in names:
+            os.remove(os.path.join(directory, name))
+        return len(names)
+
+    def open_read(self, key):
+        return open(self.path(key), 'rb')
+
+    def put_bytes(self, key, data):
+        os.makedirs(os.path.dirname(self.path(key)) or '.', exist_ok=True)
+        with open(self.path(key) + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(self.path(key) + '.tmp', self.path(key))
+
+    def put_file(self, key, file_path):
+        if os.path.abspath(file_path) != os.path.abspath(self.path(key)):
+            os.makedirs(os.path.dirname(self.path(key)) or '.', exist_ok=True)
+            shutil.copyfile(file_path, self.path(key) + '.tmp')
+            os.replace(self.path(key) + '.tmp', self.path(key))
+
+    def open_upload(self, key):
+        os.makedirs(os.path.dirname(self.path(key)) or '.', exist_ok=True)
+        return LocalUpload(self.path(key))
+
+    def move(self, source_key, key):
+        os.replace(self.path(source_key), self.path(key))
+
+class LocalUpload:
+    # Written to a temporary file that replaces the target on complete().
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path + '.tmp', 'wb')
+
+    def write(self, data):
+        self.f.write(data)
+
+    def complete(self):
+        self.f.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.path + '.tmp')
+
+class S3Storage:
+    def __init__(self, bucket, client=None, part_size=8 * 1024 * 1024, max_attempts=5, logger=None):
+        self.bucket = bucket
+        self.client = client if client is not None else boto3.client('s3')
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_attempts = max_attempts
+        self.logger = logger
+
+    def _retry(self, action, description):
+        return retry(action, description, self.logger, self.max_attempts)
+
+    def location(self, key):
+        return 's3://' + self.bucket + '/' + key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def list(self, prefix):
+        # The keys starting with prefix, sorted.
+        keys = []
+        pages = self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix)
+        for page in pages:
+            keys.extend([item['Key'] for item in page.get('Contents', [])])
+        return sorted(keys)
+
+    def delete(self, key):
+        self._retry(lambda: self.client.delete_object(Bucket=self.bucket, Key=key), 'Deleting ' + key)
+
+    def abort_uploads(self, prefix):
+        # Aborts the multipart uploads under prefix that a crashed run never completed; S3 keeps
+        # (and bills) their parts until then. Uploads of keys no run opens again (e.g. the chunks
+        # of a node that died in queue mode) are only cleaned up by a lifecycle rule on the bucket
+        # (AbortIncompleteMultipartUpload), which should be set.
+        aborted = 0
+        pages = self.client.get_paginator('list_multipart_uploads').paginate(Bucket=self.bucket, Prefix=prefix)
+        for page in pages:
+            for upload in page.get('Uploads', []):
+                self._retry(lambda: self.client.abort_multipart_upload(Bucket=self.bucket, Key=upload['Key'],
+                                                                       UploadId=upload['UploadId']),
+                            'Aborting the upload of ' + upload['Key'])
+                aborted += 1
+        return aborted
+
+    def open_read(self, key):
+        # A streaming body: read(n) pulls the object over the network n bytes at a time.
+        return self._retry(lambda: self.client.get_object(Bucket=self.bucket, Key=key), 'Reading ' + key)['Body']
+
+    def put_bytes(self, key, data):
+        self._retry(lambda: self.client.put_object(Bucket=self.bucket, Key=key, Body=data), 'Uploading ' + key)
+
+    def put_file(self, key, file_path):
+        # Uploads the file part by part, so memory never holds more than one part.
+        upload = self.open_upload(key)
+        try:
+            with open(file_path, 'rb') as f:
+                while True:
+                    data = f.read(self.part_size)
+                    if len(data) == 0:
+                        break
+                    upload.write(data)
+            upload.complete()
+        except:
+            upload.abort()
+            raise
+
+    def open_upload(self, key):
+        return S3MultipartUpload(self, key)
+
+    def move(self, source_key, key):
+        # Managed copy: objects over 5 GB are copied with a multipart copy.
+        self._retry(lambda: self.client.copy({'Bucket': self.bucket, 'Key': source_key}, self.bucket, key),
+                    'Copying ' + source_key + ' to ' + key)
+        self._retry(lambda: self.client.delete_object(Bucket=self.bucket, Key=source_key), 'Deleting ' + source_key)
+
+class S3MultipartUpload:
+    # Buffers writes until a part is full and uploads it right away, retrying failed parts.
+    # Nothing becomes visible under key until complete(); abort() discards the uploaded parts.
+    def __init__(self, storage, key):
+        self.storage = storage
+        self.key = key
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = storage._retry(
+            lambda: storage.client.create_multipart_upload(Bucket=storage.bucket, Key=key),
+            'Starting the upload of ' + key)['UploadId']
+
+    def _upload_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.storage._retry(
+            lambda: self.storage.client.upload_part(Bucket=self.storage.bucket, Key=self.key, UploadId=self.upload_id,
+                                                    PartNumber=part_number, Body=data),
+            'Uploading part {} of {}'.format(part_number, self.key))
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def write(self, data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.storage.part_size:
+            self._upload_part(bytes(self.buffer[:self.storage.part_size]))
+            del self.buffer[:self.storage.part_size]
+
+    def complete(self):
+        # S3 needs at least one part; the last one may be smaller than the minimum part size.
+        if len(self.buffer) > 0 or len(self.parts) == 0:
+            self._upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.storage._retry(
+            lambda: self.storage.client.complete_multipart_upload(Bucket=self.storage.bucket, Key=self.key,
+                                                                  UploadId=self.upload_id,
+                                                                  MultipartUpload={'Parts': self.parts}),
+            'Completing the upload of ' + self.key)
+
+    def abort(self):
+        try:
+            self.storage.client.abort_multipart_upload(Bucket=self.storage.bucket, Key=self.key,
+                                                       UploadId=self.upload_id)
+        except (BotoCoreError, ClientError):
+            pass
@@ -0,0 +1,18 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='module')
+def scraper():
+    # The script parses its options on import.
+    argv = sys.argv
+    sys.argv = ['yelp_review_scraper.py', '--collected_object', 'review']
+    try:
+        yield importlib.import_module('yelp_review_scraper')
+    finally:
+        sys.argv = argv
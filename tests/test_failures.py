@@ -0,0 +1,27 @@
+import aiohttp
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, \
+    WebDriverException
+from selenium.webdriver.common.by import By
+
+import fetchers
+
+def test_missing_element_is_permanent(scraper):
+    driver = fetchers.SnapshotDriver()
+    driver.load('http://127.0.0.1/biz/a', '<html><body><h1>Other page</h1></body></html>')
+    with pytest.raises(NoSuchElementException) as e:
+        driver.find_element(By.XPATH, './/div[@aria-label="Pagination navigation"]')
+    assert scraper.failure_class(e.value, 1) == scraper.PERMANENT
+    assert scraper.failure_class(StaleElementReferenceException(), 1) == scraper.PERMANENT
+
+def test_browser_and_network_errors_are_transient(scraper):
+    assert scraper.failure_class(TimeoutException(), 1) == scraper.TRANSIENT
+    assert scraper.failure_class(WebDriverException('chrome not reachable'), 1) == scraper.TRANSIENT
+    assert scraper.failure_class(aiohttp.ClientConnectionError(), 1) == scraper.TRANSIENT
+    assert scraper.failure_class(scraper.EmptyReviewSectionError('http://127.0.0.1/biz/a'), 1) == scraper.TRANSIENT
+
+def test_blocked_and_deleted(scraper):
+    assert scraper.failure_class(scraper.DetectedAsRobotError(), 1) == scraper.BLOCKED
+    assert scraper.failure_class(fetchers.BlockedResponseError('http://127.0.0.1/biz/a', 429), 1) == scraper.BLOCKED
+    assert scraper.failure_class(scraper.DeletedBusinessError(), 1) == scraper.PERMANENT
+    assert scraper.failure_class(ValueError(), 1) == scraper.PERMANENT
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+import journal
+import leases
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def open_queue(request, tmp_path):
+    # Opens a queue of one store for a node; every call shares the same store.
+    if request.param == 'sqlite':
+        path = str(tmp_path / 'queue.db')
+
+        def open_sqlite(owner, queue_name='review:test', **kwargs):
+            return leases.LeaseQueue(path, queue_name, owner=owner, **kwargs)
+        return open_sqlite
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+
+    def open_redis(owner, queue_name='review:test', **kwargs):
+        return leases.RedisLeaseQueue(fakeredis.FakeRedis(server=server), queue_name, owner=owner, **kwargs)
+    return open_redis
+
+def test_a_task_is_leased_to_one_node(open_queue):
+    a = open_queue('a')
+    b = open_queue('b')
+    a.populate(range(4))
+    b.populate(range(4))
+    first = a.lease(2)
+    second = b.lease(10)
+    assert len(first) == 2
+    assert sorted(first + second) == ['0', '1', '2', '3']
+    assert b.lease(10) == []
+
+def test_expired_lease_is_reissued(open_queue):
+    a = open_queue('a', lease_seconds=0.1)
+    b = open_queue('b', lease_seconds=0.1)
+    a.populate(range(2))
+    assert sorted(a.lease(2)) == ['0', '1']
+    assert b.lease(2) == []
+    time.sleep(0.2)
+    assert sorted(b.lease(2)) == ['0', '1']
+    assert b.reissued_num == 2
+    # The node that lost the lease can no longer complete the task.
+    a.complete(['0'], journal.DONE)
+    assert a.counts() == {leases.LEASED: 2}
+    b.complete(['0', '1'], journal.DONE)
+    assert a.counts() == {journal.DONE: 2}
+    assert a.unfinished_num() == 0
+
+def test_heartbeat_keeps_the_lease(open_queue):
+    a = open_queue('a', lease_seconds=0.3)
+    b = open_queue('b', lease_seconds=0.3)
+    a.populate(['0'])
+    a.lease(1)
+    for _ in range(3):
+        time.sleep(0.15)
+        assert a.heartbeat() == 1
+    assert b.lease(1) == []
+
+def test_background_heartbeat_stops_with_the_node(open_queue):
+    a = open_queue('a', lease_seconds=0.3)
+    b = open_queue('b', lease_seconds=0.3)
+    a.populate(['0'])
+    a.lease(1)
+    a.start_heartbeat(0.05)
+    time.sleep(0.6)
+    assert b.lease(1) == []
+    a.stop_heartbeat()
+    time.sleep(0.4)
+    assert b.lease(1) == ['0']
+
+def test_failed_task_is_retried_until_max_attempts(open_queue):
+    a = open_queue('a', max_attempts=2)
+    a.populate(['0'])
+    assert a.lease(1) == ['0']
+    assert a.fail('0')
+    assert a.lease(1) == ['0']
+    assert not a.fail('0')
+    assert a.lease(1) == []
+    assert a.counts() == {leases.FAILED: 1}
+
+def test_failed_task_waits_for_its_delay(open_queue):
+    a = open_queue('a')
+    a.populate(['0'])
+    a.lease(1)
+    assert a.fail('0', delay=0.3)
+    assert a.lease(1) == []
+    assert a.unfinished_num() == 1
+    time.sleep(0.4)
+    assert a.lease(1) == ['0']
+
+def test_task_that_keeps_expiring_is_given_up(open_queue):
+    a = open_queue('a', lease_seconds=0.1, max_attempts=1)
+    b = open_queue('b', lease_seconds=0.1, max_attempts=1)
+    a.populate(['0'])
+    a.lease(1)
+    time.sleep(0.2)
+    assert b.lease(1) == []
+    assert b.counts() == {leases.FAILED: 1}
+
+def test_released_tasks_go_back_without_an_attempt(open_queue):
+    a = open_queue('a', max_attempts=1)
+    b = open_queue('b', max_attempts=1)
+    a.populate(range(2))
+    a.lease(2)
+    a.release()
+    assert sorted(b.lease(2)) == ['0', '1']
+    assert b.reissued_num == 0
+    assert b.fail('0') is False
+
+def test_queues_of_one_store_are_separate(open_queue):
+    a = open_queue('a', 'review:list:0:9')
+    b = open_queue('b', 'review:list:10:19')
+    a.populate(range(3))
+    b.populate(range(10, 12))
+    assert sorted(b.lease(10)) == ['10', '11']
+    assert sorted(b.tasks()) == ['10', '11']
@@ -0,0 +1,28 @@
+import os
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'biz',
+                       'fishtag-new-york.html')
+FULL_TEXT = 'Great   branzino.<br>Will return for the brunch.'
+
+class Browser:
+    # A browser page whose first comment is cut short until 'Read more' is clicked.
+    def __init__(self):
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.full_source = f.read()
+        self.expanded = False
+
+    @property
+    def page_source(self):
+        if self.expanded:
+            return self.full_source
+        return self.full_source.replace(FULL_TEXT, 'Great   branzino.')
+
+    def execute_script(self, script, *args):
+        self.expanded = True
+        return 1
+
+def test_snapshot_parsing_reads_the_expanded_comments(scraper, monkeypatch):
+    monkeypatch.setattr(scraper.args, 'parse_mode', 'snapshot')
+    monkeypatch.setattr(scraper.time, 'sleep', lambda seconds: None)
+    records = scraper.collect_review_records(Browser(), None, [], 'fishtag-new-york', 'Fishtag')
+    assert records[0][15] == 'Great branzino.\nWill return for the brunch.'
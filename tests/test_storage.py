@@ -0,0 +1,85 @@
+import os
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import storage
+
+BUCKET = 'test-bucket'
+
+@pytest.fixture
+def s3():
+    os.environ.update(AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing', AWS_DEFAULT_REGION='us-east-1')
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET)
+        yield storage.S3Storage(BUCKET, client, part_size=storage.MIN_PART_SIZE, max_attempts=1)
+
+def in_progress(s3):
+    return s3.client.list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])
+
+def test_upload_is_complete_only_after_complete(s3):
+    data = os.urandom(storage.MIN_PART_SIZE + 1000)
+    upload = s3.open_upload('result.csv')
+    for i in range(0, len(data), 100000):
+        upload.write(data[i:i + 100000])
+    # The full part is already uploaded; the rest waits in the buffer.
+    assert len(upload.parts) == 1
+    assert not s3.exists('result.csv')
+    upload.complete()
+    assert len(upload.parts) == 2
+    assert s3.client.get_object(Bucket=BUCKET, Key='result.csv')['Body'].read() == data
+    assert in_progress(s3) == []
+
+def test_empty_upload_completes(s3):
+    upload = s3.open_upload('empty.csv')
+    upload.complete()
+    assert s3.client.get_object(Bucket=BUCKET, Key='empty.csv')['Body'].read() == b''
+
+def test_abort_discards_the_parts(s3):
+    upload = s3.open_upload('result.csv')
+    upload.write(os.urandom(storage.MIN_PART_SIZE))
+    assert len(in_progress(s3)) == 1
+    upload.abort()
+    assert in_progress(s3) == []
+    assert not s3.exists('result.csv')
+
+def test_put_file_aborts_when_the_file_fails(s3, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        s3.put_file('result.csv', str(tmp_path / 'missing.csv'))
+    assert in_progress(s3) == []
+    assert not s3.exists('result.csv')
+
+def test_move_renames_the_upload(s3):
+    upload = s3.open_upload('result.csv.partial')
+    upload.write(b'a,b\n1,2\n')
+    upload.complete()
+    s3.move('result.csv.partial', 'result.csv')
+    assert s3.client.get_object(Bucket=BUCKET, Key='result.csv')['Body'].read() == b'a,b\n1,2\n'
+    assert not s3.exists('result.csv.partial')
+
+def test_missing_bucket_is_not_retried():
+    os.environ.update(AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing', AWS_DEFAULT_REGION='us-east-1')
+    with mock_aws():
+        s3 = storage.S3Storage('no-such-bucket', boto3.client('s3'), max_attempts=5)
+        with pytest.raises(ClientError):
+            s3.open_upload('result.csv')
+
+def test_abort_uploads_discards_crashed_uploads_under_the_prefix(s3):
+    # A crashed run leaves its uploads open; a run of another key keeps its own.
+    s3.open_upload('result.csv.partial').write(os.urandom(storage.MIN_PART_SIZE))
+    s3.open_upload('result.csv.partial')
+    other = s3.open_upload('other.csv.partial')
+    assert s3.abort_uploads('result.csv.partial') == 2
+    assert [upload['Key'] for upload in in_progress(s3)] == ['other.csv.partial']
+    other.complete()
+    assert s3.exists('other.csv.partial')
+
+def test_local_abort_uploads_removes_temporary_files(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    local.open_upload('parts/a.csv').write(b'a')
+    local.put_bytes('parts/b.csv', b'b')
+    assert local.abort_uploads('parts/') == 1
+    assert sorted(os.listdir(str(tmp_path / 'parts'))) == ['b.csv']
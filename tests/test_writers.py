@@ -0,0 +1,20 @@
+import os
+
+import writers
+
+RECORD = {'user_id': 'aB3xY9'}
+
+def write_chunk(parts_dir, resume):
+    writer = writers.StreamingWriter('profile', str(parts_dir), chunk_size=1, resume=resume)
+    writer.write(0, RECORD)
+    return writer
+
+def test_parts_of_an_earlier_run_are_cleared(tmp_path):
+    write_chunk(tmp_path, False)
+    writer = write_chunk(tmp_path, False)
+    assert [os.path.basename(part) for part in writer.finalized_parts()] == ['part-00001.csv']
+
+def test_parts_are_reused_on_resume(tmp_path):
+    write_chunk(tmp_path, False)
+    writer = write_chunk(tmp_path, True)
+    assert [os.path.basename(part) for part in writer.finalized_parts()] == ['part-00001.csv', 'part-00002.csv']
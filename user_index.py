@@ -0,0 +1,78 @@
+import argparse
+import csv
+import sqlite3
+import time
+
+# Every user ID the scrapers have come across, on disk: when a review run first and last saw the
+# user, and when the profile was last scraped. The table is keyed by user_id without a rowid,
+# so a membership check is a single B-tree lookup even with tens of millions of users.
+
+# Stays below the oldest SQLite limit on query parameters.
+BATCH_SIZE = 900
+
+class UserIndex:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, first_seen REAL, '
+                          'last_seen REAL, scraped_at REAL) WITHOUT ROWID')
+        self.conn.commit()
+
+    def add_seen(self, user_ids):
+        # Adds the users found in reviews.
+        now = time.time()
+        with self.conn:
+            self.conn.executemany('INSERT INTO users VALUES (?, ?, ?, NULL) '
+                                  'ON CONFLICT (user_id) DO UPDATE SET last_seen = excluded.last_seen',
+                                  [(user_id, now, now) for user_id in user_ids])
+
+    def mark_scraped(self, user_ids):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany('INSERT INTO users VALUES (?, ?, ?, ?) '
+                                  'ON CONFLICT (user_id) DO UPDATE SET scraped_at = excluded.scraped_at',
+                                  [(user_id, now, now, now) for user_id in user_ids])
+
+    def fresh(self, user_ids, max_age=0):
+        # The users of user_ids whose profile was scraped in the last max_age seconds (ever if 0).
+        since = time.time() - max_age if max_age > 0 else 0
+        user_ids = list(user_ids)
+        fresh = set()
+        for i in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[i:i + BATCH_SIZE]
+            rows = self.conn.execute('SELECT user_id FROM users WHERE scraped_at >= ? AND user_id IN ({})'.format(
+                ', '.join(['?'] * len(batch))), [since] + batch)
+            fresh.update([row[0] for row in rows])
+        return fresh
+
+    def stale(self, max_age=0):
+        # Yields the users whose profile has not been scraped in the last max_age seconds (never if 0).
+        if max_age > 0:
+            rows = self.conn.execute('SELECT user_id FROM users WHERE scraped_at IS NULL OR scraped_at < ?',
+                                     (time.time() - max_age,))
+        else:
+            rows = self.conn.execute('SELECT user_id FROM users WHERE scraped_at IS NULL')
+        for row in rows:
+            yield row[0]
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == '__main__':
+    # Writes a profile target list of the users that need their profile scraped.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--user_index_path', default='yelp_users.db', type=str)
+    parser.add_argument('--profile_fresh_days', default=30, type=float)
+    parser.add_argument('--output', default='User_List.csv', type=str)
+    args = parser.parse_args()
+    index = UserIndex(args.user_index_path)
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['userid'])
+        user_num = 0
+        for user_id in index.stale(args.profile_fresh_days * 86400):
+            writer.writerow([user_id])
+            user_num += 1
+    index.close()
+    print('{} users have been written to {}.'.format(user_num, args.output))
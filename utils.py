@@ -1,5 +1,120 @@
+import itertools
+
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+REVIEW_COLUMNS = ['yelpid', 'name', 'user_name', 'user_id', 'user_elite', 'user_first_review',
+                  'user_loc', 'user_friend_num', 'user_review_num', 'user_photos_num',
+                  'rating', 'date', 'updated', 'posted_photo_num',
+                  'check_ins_num', 'comment', 'helpful', 'thanks', 'love_this',
+                  'oh_no', 'owner_comment_date', 'owner_comment', 'previous_ratings',
+                  'previous_dates', 'previous_comments', 'previous_helpfuls',
+                  'previous_thanks', 'previous_love_this', 'previous_oh_no']
+
+PROFILE_COLUMNS = ['userid', 'name', 'loc', 'profile_photo_urls', 'friends', 'reviews', 'photos', 'elites',
+                   'tagline',
+                   'star_5', 'star_4', 'star_3', 'star_2', 'star_1',
+                   'helpful', 'thanks', 'love_this', 'oh_no',
+                   'review_updates', 'firsts', 'followers',
+                   'top1_name', 'top1_num', 'top2_name', 'top2_num', 'top3_name', 'top3_num',
+                   'top4_name', 'top4_num', 'top5_name', 'top5_num',
+                   'thank_you', 'cute_pic', 'good_writer', 'hot_stuff', 'just_a_note', 'like_your_profile',
+                   'write_more', 'you_are_cool', 'great_photos', 'great_lists', 'you_are_funny',
+                   'location', 'yelping_since', 'things_i_love', 'find_me_in', 'my_hometown',
+                   'my_blog_or_website', 'when_im_not_yelping', 'why_ysrmr', 'my_second_fw', 'last_great_book',
+                   'my_first_concert', 'my_favorite_movie', 'my_last_meal_on_earth', 'dont_tell_anyone_else_but',
+                   'most_recent_discovery', 'current_crush']
+
+# Compliment test ids and "More about me" titles a profile page is read for.
+COMPLIMENT_IDS = ['thankYou', 'justANote', 'greatPhoto', 'goodWriter', 'ilikeYourProfile', 'justANote',
+                  'writeMore', 'youAreCool', 'cutePic', 'greatList', 'youAreFunny', 'hotStuff']
+ABOUT_ME_TITLES = ['Location', 'Yelping since', 'Things I Love', 'Find Me In', 'My Hometown', 'My Blog Or Website',
+                   'When I’m Not Yelping...', 'Why You Should Read My Reviews', 'My Second Favorite Website',
+                   'The Last Great Book I Read', 'My First Concert', 'My Favorite Movie', 'My Last Meal On Earth',
+                   'Don’t Tell Anyone Else But...', 'Most Recent Discovery', 'Current Crush']
+
+RESTAURANT_COLUMNS = ['yelpid', 'name', 'closed', 'verified', 'rating', 'review', 'pricerange', 'categorylist',
+                      'photos', 'phone', 'address', 'openingtimes', 'morebusinessinfo']
+
+# Column types of the Parquet output. Unlisted columns are strings; dates are parsed with the given format.
+REVIEW_SCHEMA = {'yelpid': 'category', 'name': 'category', 'user_elite': 'int', 'user_first_review': 'int',
+                 'user_loc': 'category', 'user_friend_num': 'int', 'user_review_num': 'int',
+                 'user_photos_num': 'int', 'rating': 'int', 'date': ('date', '%b %d, %Y'), 'updated': 'int',
+                 'posted_photo_num': 'int', 'check_ins_num': 'int', 'helpful': 'int', 'thanks': 'int',
+                 'love_this': 'int', 'oh_no': 'int', 'owner_comment_date': ('date', '%b %d, %Y')}
+
+PROFILE_SCHEMA = dict({'loc': 'category', 'yelping_since': ('date', '%B %Y'), 'location': 'category',
+                       'my_hometown': 'category'},
+                      **{column: 'int' for column in ['friends', 'reviews', 'photos', 'elites', 'star_5', 'star_4',
+                                                      'star_3', 'star_2', 'star_1', 'helpful', 'thanks',
+                                                      'love_this', 'oh_no', 'review_updates', 'firsts',
+                                                      'followers', 'thank_you', 'cute_pic', 'good_writer',
+                                                      'hot_stuff', 'just_a_note', 'like_your_profile',
+                                                      'write_more', 'you_are_cool', 'great_photos',
+                                                      'great_lists', 'you_are_funny']},
+                      **{'top{}_name'.format(i): 'category' for i in range(1, 6)},
+                      **{'top{}_num'.format(i): 'int' for i in range(1, 6)})
+
+RESTAURANT_SCHEMA = {'yelpid': 'category', 'verified': 'category', 'rating': 'float', 'review': 'int',
+                     'pricerange': 'category', 'photos': 'int'}
+
+# The columns each mode needs from the target list. The first name of each is the one the
+# scrapers use; the others are accepted in the list file.
+TARGET_COLUMNS = {'profile': [['userid', 'user_id']],
+                  'review': [['yelpid', 'yelp_id'], ['name'], ['scrapedurl']],
+                  'restaurant': [['yelpid', 'yelp_id'], ['name'], ['scrapedurl']]}
+
+def target_columns(header, mode):
+    # Maps the columns of the list file to the names the scrapers use, or None if one is missing.
+    columns = {}
+    for names in TARGET_COLUMNS[mode]:
+        found = [name for name in names if name in header]
+        if len(found) == 0:
+            return None
+        columns[found[0]] = names[0]
+    return columns
+
+def load_targets(source, mode, min_index=0, max_index=-1, indices=None, chunk_size=100000):
+    # Reads the rows min_index..max_index (to the end if -1) of the target list, or only the rows in
+    # indices, keeping only the columns mode needs. source is a path or a file object such as an S3
+    # body, read chunk by chunk and no further than the last wanted row.
+    # Returns the rows, indexed by row number (None if a column is missing), and the number of rows
+    # in the file (-1 if it was not read to the end).
+    names = set(itertools.chain(*TARGET_COLUMNS[mode]))
+    if indices is not None:
+        indices = set(indices)
+        min_index = min(indices)
+        max_index = max(indices)
+    columns = None
+    frames = []
+    row_num = 0
+    for chunk in pd.read_csv(source, usecols=lambda column: column in names, dtype=str, chunksize=chunk_size,
+                             encoding='utf-8'):
+        if columns is None:
+            columns = target_columns(chunk.columns, mode)
+            if columns is None:
+                return None, -1
+        chunk.index = pd.RangeIndex(row_num, row_num + len(chunk))
+        row_num += len(chunk)
+        if indices is not None:
+            chunk = chunk[chunk.index.isin(indices)]
+        else:
+            chunk = chunk[chunk.index >= min_index]
+            if max_index != -1:
+                chunk = chunk[chunk.index <= max_index]
+        frames.append(chunk[list(columns.keys())].rename(columns=columns))
+        if max_index != -1 and row_num > max_index:
+            return pd.concat(frames), -1
+    if columns is None:
+        return pd.DataFrame(columns=[names[0] for names in TARGET_COLUMNS[mode]]), row_num
+    return pd.concat(frames), row_num
+
 def load_specific_mode_file(_path, page=False):
     ilist = []
     with open(_path, 'r') as f:
@@ -26,219 +141,87 @@ def check_page_list(ilist):
             pass_ = False
     return pass_
 
+def balanced_chunks(items, max_chunk_size):
+    # Splits items into the fewest contiguous chunks of at most max_chunk_size items whose
+    # sizes differ by one at most.
+    chunk_num = -(-len(items) // max_chunk_size)
+    chunks = []
+    start = 0
+    for i in range(chunk_num):
+        end = start + len(items) // chunk_num + (i < len(items) % chunk_num)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
 def set_to_df(_set, mode):
+    # Builds the result with a single DataFrame construction; the values of _set are
+    # per-object records (profile) or per-object column lists (review, restaurant).
     if mode == 'profile':
-        profile_info = ['userid', 'name', 'loc', 'profile_photo_urls', 'friends', 'reviews', 'photos', 'elites',
-                        'tagline',
-                        'star_5', 'star_4', 'star_3', 'star_2', 'star_1',
-                        'helpful', 'thanks', 'love_this', 'oh_no',
-                        'review_updates', 'firsts', 'followers',
-                        'top1_name', 'top1_num', 'top2_name', 'top2_num', 'top3_name', 'top3_num',
-                        'top4_name', 'top4_num', 'top5_name', 'top5_num',
-                        'thank_you', 'cute_pic', 'good_writer', 'hot_stuff', 'just_a_note', 'like_your_profile',
-                        'write_more', 'you_are_cool', 'great_photos', 'great_lists', 'you_are_funny',
-                        'location', 'yelping_since', 'things_i_love', 'find_me_in', 'my_hometown',
-                        'my_blog_or_website', 'when_im_not_yelping', 'why_ysrmr', 'my_second_fw', 'last_great_book',
-                        'my_first_concert', 'my_favorite_movie', 'my_last_meal_on_earth', 'dont_tell_anyone_else_but',
-                        'most_recent_discovery', 'current_crush']
-        all_profiles = pd.DataFrame(columns=profile_info)
-
-        for profiles in _set.values():
-            userid = profiles[0]
-            name = profiles[1]
-            loc = profiles[2]
-            profile_photo_urls = profiles[3]
-            friends = profiles[4]
-            reviews = profiles[5]
-            photos = profiles[6]
-            elites = profiles[7]
-            tagline = profiles[8]
-            star_5 = profiles[9]
-            star_4 = profiles[10]
-            star_3 = profiles[11]
-            star_2 = profiles[12]
-            star_1 = profiles[13]
-            helpful = profiles[14]
-            thanks = profiles[15]
-            love_this = profiles[16]
-            oh_no = profiles[17]
-            review_updates = profiles[18]
-            firsts = profiles[19]
-            followers = profiles[20]
-            top1_name = profiles[21]
-            top1_num = profiles[22]
-            top2_name = profiles[23]
-            top2_num = profiles[24]
-            top3_name = profiles[25]
-            top3_num = profiles[26]
-            top4_name = profiles[27]
-            top4_num = profiles[28]
-            top5_name = profiles[29]
-            top5_num = profiles[30]
-            thank_you = profiles[31]
-            cute_pic = profiles[32]
-            good_writer = profiles[33]
-            hot_stuff = profiles[34]
-            just_a_note = profiles[35]
-            like_your_profile = profiles[36]
-            write_more = profiles[37]
-            you_are_cool = profiles[38]
-            great_photos = profiles[39]
-            great_lists = profiles[40]
-            you_are_funny = profiles[41]
-            location = profiles[42]
-            yelping_since = profiles[43]
-            things_i_love = profiles[44]
-            find_me_in = profiles[45]
-            my_hometown = profiles[46]
-            my_blog_or_website = profiles[47]
-            when_im_not_yelping = profiles[48]
-            why_ysrmr = profiles[49]
-            my_second_fw = profiles[50]
-            last_great_book = profiles[51]
-            my_first_concert = profiles[52]
-            my_favorite_movie = profiles[53]
-            my_last_meal_on_earth = profiles[54]
-            dont_tell_anyone_else_but = profiles[55]
-            most_recent_discovery = profiles[56]
-            current_crush = profiles[57]
-
-            this_profile = pd.DataFrame.from_records([{'userid' : userid, 'name' : name, 'loc' : loc,
-                                                       'profile_photo_urls': profile_photo_urls, 'friends' : friends,
-                                                       'reviews' : reviews, 'photos' : photos, 'elites': elites,
-                                                       'tagline': tagline, 'star_5' : star_5, 'star_4' : star_4,
-                                                       'star_3' : star_3, 'star_2' : star_2, 'star_1' : star_1,
-                                                       'helpful' : helpful, 'thanks' : thanks, 'love_this': love_this,
-                                                       'oh_no': oh_no, 'review_updates': review_updates,
-                                                       'firsts': firsts, 'followers': followers,
-                                                       'top1_name': top1_name, 'top1_num': top1_num,
-                                                       'top2_name': top2_name, 'top2_num': top2_num,
-                                                       'top3_name': top3_name, 'top3_num': top3_num,
-                                                       'top4_name': top4_name, 'top4_num': top4_num,
-                                                       'top5_name': top5_name, 'top5_num': top5_num,
-                                                       'thank_you': thank_you, 'cute_pic': cute_pic,
-                                                       'good_writer': good_writer, 'hot_stuff': hot_stuff,
-                                                       'just_a_note': just_a_note,
-                                                       'like_your_profile': like_your_profile, 'write_more': write_more,
-                                                       'you_are_cool': you_are_cool, 'great_photos': great_photos,
-                                                       'great_lists': great_lists, 'you_are_funny': you_are_funny,
-                                                       'location': location, 'yelping_since': yelping_since,
-                                                       'things_i_love': things_i_love, 'find_me_in': find_me_in,
-                                                       'my_hometown': my_hometown,
-                                                       'my_blog_or_website': my_blog_or_website,
-                                                       'when_im_not_yelping': when_im_not_yelping,
-                                                       'why_ysrmr': why_ysrmr, 'my_second_fw': my_second_fw,
-                                                       'last_great_book': last_great_book,
-                                                       'my_first_concert': my_first_concert,
-                                                       'my_favorite_movie': my_favorite_movie,
-                                                       'my_last_meal_on_earth': my_last_meal_on_earth,
-                                                       'dont_tell_anyone_else_but': dont_tell_anyone_else_but,
-                                                       'most_recent_discovery': most_recent_discovery,
-                                                       'current_crush': current_crush}])
-
-            all_profiles = pd.concat([all_profiles, this_profile])
-
-        return all_profiles
+        return pd.DataFrame.from_records(list(_set.values()), columns=PROFILE_COLUMNS)
 
     elif mode == 'review':
-        review_info = ['yelpid', 'name', 'user_name', 'user_id', 'user_elite', 'user_first_review',
-                       'user_loc', 'user_friend_num', 'user_review_num', 'user_photos_num',
-                       'rating', 'date', 'updated', 'posted_photo_num',
-                       'check_ins_num', 'comment', 'helpful', 'thanks', 'love_this',
-                       'oh_no', 'owner_comment_date', 'owner_comment', 'previous_ratings',
-                       'previous_dates', 'previous_comments', 'previous_helpfuls',
-                       'previous_thanks', 'previous_love_this', 'previous_oh_no']
-        all_reviews = pd.DataFrame(columns=review_info)
-
-        for reviews in _set.values():
-            yelp_id = reviews[0]
-            yelp_name = reviews[1]
-            user_name = reviews[2]
-            user_id = reviews[3]
-            user_elite = reviews[4]
-            user_first_reivew = reviews[5]
-            user_loc = reviews[6]
-            user_friend_num = reviews[7]
-            user_review_num = reviews[8]
-            user_photos_num = reviews[9]
-            rating = reviews[10]
-            date = reviews[11]
-            user_review_updated = reviews[12]
-            user_num_posted_photo = reviews[13]
-            user_num_check_ins = reviews[14]
-            comment = reviews[15]
-            helpful = reviews[16]
-            thanks = reviews[17]
-            love_this = reviews[18]
-            oh_no = reviews[19]
-            owner_comment_date = reviews[20]
-            owner_comment = reviews[21]
-            previous_ratings = reviews[22]
-            previous_dates = reviews[23]
-            previous_comments = reviews[24]
-            previous_helpfuls = reviews[25]
-            previous_thankss = reviews[26]
-            previous_love_thiss = reviews[27]
-            previous_oh_nos = reviews[28]
-
-            this_reviews = pd.DataFrame({'yelpid': yelp_id, 'name': yelp_name,
-                                         'user_name': user_name, 'user_id': user_id,
-                                         'user_elite': user_elite, 'user_first_review': user_first_reivew,
-                                         'user_loc': user_loc, 'user_friend_num': user_friend_num,
-                                         'user_review_num': user_review_num,
-                                         'user_photos_num': user_photos_num,
-                                         'rating': rating, 'date': date, 'updated': user_review_updated,
-                                         'posted_photo_num': user_num_posted_photo,
-                                         'check_ins_num': user_num_check_ins,
-                                         'comment': comment, 'helpful': helpful, 'thanks': thanks,
-                                         'love_this': love_this, 'oh_no': oh_no,
-                                         'owner_comment_date': owner_comment_date,
-                                         'owner_comment':owner_comment,
-                                         'previous_ratings': previous_ratings,
-                                         'previous_dates': previous_dates,
-                                         'previous_comments': previous_comments,
-                                         'previous_helpfuls': previous_helpfuls,
-                                         'previous_thanks': previous_thankss,
-                                         'previous_love_this': previous_love_thiss,
-                                         'previous_oh_no': previous_oh_nos})
-
-            all_reviews = pd.concat([all_reviews, this_reviews])
-
-        return all_reviews
-
+        columns = REVIEW_COLUMNS
     else:
-        res_info = ['yelpid', 'name', 'closed', 'verified', 'rating', 'review', 'princerange', 'categorylist', 'photos',
-                    'phone', 'address', 'openingtimes', 'morebusinessinfo']
-        all_res_info = pd.DataFrame(columns=res_info)
-
-        for res in _set.values():
-            yelpid = res[0]
-            name = res[1]
-            closed = res[1]
-            claimed = res[2]
-            rating = res[3]
-            review = res[4]
-            pricerange = res[5]
-            categorylist = res[6]
-            photos = res[7]
-            phone = res[8]
-            address = res[9]
-            openingtimes = res[10]
-            morebusinessinfo = res[11]
-
-            this_res = pd.DataFrame({'yelpid': yelpid,
-                                     'name': name,
-                                     'closed': closed,
-                                     'verified': claimed,
-                                     'rating': rating,
-                                     'review': review,
-                                     'pricerange': pricerange,
-                                     'categorylist': categorylist,
-                                     'photos': photos,
-                                     'phone': phone,
-                                     'address': address,
-                                     'openingtimes': openingtimes,
-                                     'morebusinessinfo': morebusinessinfo})
-            all_res_info = pd.concat([all_res_info, this_res])
-
-        return all_res_info
\ No newline at end of file
+        columns = RESTAURANT_COLUMNS
+
+    data = {}
+    for i, column in enumerate(columns):
+        data[column] = list(itertools.chain.from_iterable(record[i] for record in _set.values()))
+    return pd.DataFrame(data, columns=columns)
+
+def mode_columns_and_schema(mode):
+    if mode == 'profile':
+        return PROFILE_COLUMNS, PROFILE_SCHEMA
+    elif mode == 'review':
+        return REVIEW_COLUMNS, REVIEW_SCHEMA
+    return RESTAURANT_COLUMNS, RESTAURANT_SCHEMA
+
+def arrow_schema(mode):
+    # Fixed per mode, so every row group of a file has the same types whatever its values are.
+    columns, schema = mode_columns_and_schema(mode)
+    types = {'int': pa.int32(), 'float': pa.float64(), 'category': pa.dictionary(pa.int32(), pa.string())}
+    fields = []
+    for column in columns:
+        kind = schema.get(column, 'string')
+        if isinstance(kind, tuple):
+            fields.append(pa.field(column, pa.date32()))
+        else:
+            fields.append(pa.field(column, types.get(kind, pa.string())))
+    return pa.schema(fields)
+
+def apply_schema(df, mode):
+    # Converts the scraped values (or the strings of a CSV part) to the types of the schema.
+    # Values that do not parse become nulls.
+    columns, schema = mode_columns_and_schema(mode)
+    df = df.copy()
+    for column in columns:
+        kind = schema.get(column, 'string')
+        if isinstance(kind, tuple):
+            df[column] = pd.to_datetime(df[column], format=kind[1], errors='coerce').dt.date
+        elif kind == 'int':
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int32')
+        elif kind == 'float':
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif kind == 'category':
+            df[column] = df[column].astype('string').astype('category')
+        else:
+            df[column] = df[column].astype('string')
+    return df
+
+def write_parquet(frames, where, mode, compression='zstd', row_group_size=100000):
+    # Writes DataFrames of one mode to a Parquet file (a path or a binary file object). Small frames
+    # are buffered so that every row group except the last holds row_group_size rows.
+    schema = arrow_schema(mode)
+    buffered = []
+    buffered_rows = 0
+    with pq.ParquetWriter(where, schema, compression=compression) as parquet_writer:
+        for df in frames:
+            buffered.append(pa.Table.from_pandas(apply_schema(df, mode), schema=schema, preserve_index=False))
+            buffered_rows += len(df)
+            while buffered_rows >= row_group_size:
+                table = pa.concat_tables(buffered)
+                parquet_writer.write_table(table.slice(0, row_group_size), row_group_size=row_group_size)
+                buffered = [table.slice(row_group_size)]
+                buffered_rows -= row_group_size
+        if buffered_rows > 0:
+            parquet_writer.write_table(pa.concat_tables(buffered), row_group_size=row_group_size)
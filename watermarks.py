@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+import utils
+
+# Per-business high-water marks of the reviews collected so far: the date of the newest review
+# and the keys (user_id|date) of every review on that date. With the pages sorted newest first,
+# a scraper can stop at the first review at or below the mark.
+
+DATE_FORMAT = '%b %d, %Y'
+USER_ID = utils.REVIEW_COLUMNS.index('user_id')
+DATE = utils.REVIEW_COLUMNS.index('date')
+
+def parse_date(text):
+    try:
+        return datetime.strptime(text, DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+def review_key(record):
+    return record[USER_ID] + '|' + record[DATE]
+
+def newest(records):
+    # The mark of a list of review records, or None if no record has a readable date.
+    latest = None
+    for record in records:
+        date = parse_date(record[DATE])
+        if date is not None and (latest is None or date > latest):
+            latest = date
+    if latest is None:
+        return None
+    return latest, set([review_key(r) for r in records if parse_date(r[DATE]) == latest])
+
+def is_seen(mark, record):
+    # Whether record had already been collected when mark was taken.
+    date = parse_date(record[DATE])
+    if date is None:
+        return review_key(record) in mark[1]
+    return date < mark[0] or (date == mark[0] and review_key(record) in mark[1])
+
+class WatermarkStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS marks (yelpid TEXT PRIMARY KEY, latest_date TEXT, '
+                          'review_keys TEXT, updated_at REAL)')
+        self.conn.commit()
+
+    def get(self, yelpid):
+        row = self.conn.execute('SELECT latest_date, review_keys FROM marks WHERE yelpid = ?', (yelpid,)).fetchone()
+        if row is None:
+            return None
+        return datetime.strptime(row[0], '%Y-%m-%d').date(), set(json.loads(row[1]))
+
+    def update(self, marks):
+        # marks: (yelpid, mark) pairs. A mark only moves forward; on the same date the keys are merged.
+        with self.conn:
+            for yelpid, mark in marks:
+                current = self.get(yelpid)
+                if current is not None:
+                    if current[0] > mark[0]:
+                        continue
+                    if current[0] == mark[0]:
+                        mark = (mark[0], mark[1] | current[1])
+                self.conn.execute('INSERT OR REPLACE INTO marks VALUES (?, ?, ?, ?)',
+                                  (yelpid, mark[0].isoformat(), json.dumps(sorted(mark[1])), time.time()))
+
+    def close(self):
+        self.conn.close()
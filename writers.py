@@ -0,0 +1,124 @@
+import os
+import shutil
+
+import pandas as pd
+
+import utils
+
+class StreamingWriter:
+    # Appends every finished object to the current chunk file right away. A chunk is
+    # finalized by renaming it once it holds chunk_size objects, so a crash loses at most
+    # the objects of the open chunk and memory never holds more than one object's result.
+    # With an upload (see storage.py), every finalized chunk is also sent on right away, so the
+    # merged CSV is already uploaded when the run ends. With publish, every finalized chunk is
+    # handed to publish(path) instead, which stores it elsewhere; the local copy is then removed.
+    # Finalized parts left in parts_dir are kept only with resume, when a journal says their
+    # objects are done; otherwise they belong to an earlier run and are removed.
+    def __init__(self, mode, parts_dir, chunk_size=10, upload=None, publish=None, resume=False):
+        self.mode = mode
+        self.parts_dir = parts_dir
+        self.chunk_size = chunk_size
+        self.object_num = 0
+        self.chunk_indices = []
+        self.chunk_file = None
+        self.upload = upload
+        self.uploaded_part_num = 0
+        self.publish = publish
+        os.makedirs(parts_dir, exist_ok=True)
+        # An unfinished chunk of a crashed run may end with a partial record; its objects
+        # were never reported as finalized, so they get scraped again. So do the objects of a
+        # chunk that was never published.
+        for name in os.listdir(parts_dir):
+            if name.endswith('.tmp') or ((publish is not None or not resume) and name.startswith('part-')):
+                os.remove(os.path.join(parts_dir, name))
+        self.part_num = len(self.finalized_parts())
+        for part in self.finalized_parts():
+            self.upload_part(part)
+
+    def part_path(self, part_num):
+        return os.path.join(self.parts_dir, 'part-{:05d}.csv'.format(part_num))
+
+    def upload_part(self, part):
+        if self.upload is None:
+            return
+        with open(part, 'rb') as f:
+            if self.uploaded_part_num > 0:
+                f.readline()
+            while True:
+                data = f.read(1024 * 1024)
+                if len(data) == 0:
+                    break
+                self.upload.write(data)
+        self.uploaded_part_num += 1
+
+    def finalized_parts(self):
+        if not os.path.exists(self.parts_dir):
+            return []
+        return sorted([os.path.join(self.parts_dir, name) for name in os.listdir(self.parts_dir)
+                       if name.startswith('part-') and name.endswith('.csv')])
+
+    def write(self, index, record):
+        # Returns the indices whose chunk has been finalized by this write.
+        if self.chunk_file is None:
+            self.part_num += 1
+            self.chunk_file = open(self.part_path(self.part_num) + '.tmp', 'w', encoding='utf-8', newline='')
+            header = True
+        else:
+            header = False
+        utils.set_to_df({index: record}, self.mode).to_csv(self.chunk_file, header=header, index=False)
+        self.chunk_file.flush()
+        self.object_num += 1
+        self.chunk_indices.append(index)
+        if len(self.chunk_indices) >= self.chunk_size:
+            return self.finalize_chunk()
+        return []
+
+    def finalize_chunk(self):
+        if self.chunk_file is None:
+            return []
+        self.chunk_file.flush()
+        os.fsync(self.chunk_file.fileno())
+        self.chunk_file.close()
+        os.replace(self.part_path(self.part_num) + '.tmp', self.part_path(self.part_num))
+        self.chunk_file = None
+        self.upload_part(self.part_path(self.part_num))
+        if self.publish is not None:
+            self.publish(self.part_path(self.part_num))
+            os.remove(self.part_path(self.part_num))
+        finalized_indices = self.chunk_indices
+        self.chunk_indices = []
+        return finalized_indices
+
+    def close(self, file_name=None, output_format='csv', compression='zstd', row_group_size=100000):
+        # Finalizes the open chunk and, if file_name is given, merges all parts into it. With an
+        # upload, the upload is completed instead (or abandoned if there is no file_name). With
+        # publish, nothing is merged.
+        finalized_indices = self.finalize_chunk()
+        if self.publish is not None:
+            # Every part has been published; what is merged is up to the caller.
+            shutil.rmtree(self.parts_dir)
+            return finalized_indices
+        if self.upload is not None:
+            if file_name is None:
+                self.upload.abort()
+                return finalized_indices
+            self.upload.complete()
+            shutil.rmtree(self.parts_dir)
+            return finalized_indices
+        if file_name is None:
+            return finalized_indices
+        if output_format == 'parquet':
+            # Parts are read back one at a time as strings; the schema restores the types.
+            frames = (pd.read_csv(part, dtype=str, keep_default_na=False, encoding='utf-8')
+                      for part in self.finalized_parts())
+            utils.write_parquet(frames, file_name + '.tmp', self.mode, compression, row_group_size)
+        else:
+            with open(file_name + '.tmp', 'wb') as merged:
+                for i, part in enumerate(self.finalized_parts()):
+                    with open(part, 'rb') as f:
+                        if i > 0:
+                            f.readline()
+                        shutil.copyfileobj(f, merged)
+        os.replace(file_name + '.tmp', file_name)
+        shutil.rmtree(self.parts_dir)
+        return finalized_indices
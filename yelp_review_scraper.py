@@ -3,12 +3,15 @@ import time
 import random
 import logging
 import sys
-import io
 import os
 import platform
 import traceback
 import json
 import re
+import queue
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from timeit import default_timer as timer
 from datetime import timedelta, datetime
 
@@ -18,13 +21,26 @@ from selenium_stealth import stealth
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException, \
+    StaleElementReferenceException, InvalidSelectorException
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
-import boto3
-
+import driver_manager
+import fetchers
+import journal
+import leases
+import metrics
+import pacing
+import page_cache as page_cache_module
+import parsers
+import resource_blocking
+import scheduler
+import storage
+import user_index as user_index_module
 import utils
+import watermarks
+import writers
 
 parser = argparse.ArgumentParser()
 
@@ -38,27 +54,91 @@ parser.add_argument('--wait_time_for_new_index', default=3, type=int)
 parser.add_argument('--additional_wait_time', default=0, type=int)
 parser.add_argument('--wait_time_for_next_page_lb', default=10, type=int)
 parser.add_argument('--wait_time_for_next_page_ub', default=15, type=int)
+parser.add_argument('--adaptive_pacing', default=0, type=int)
+parser.add_argument('--min_wait_time', default=2, type=float)
+parser.add_argument('--max_wait_time', default=120, type=float)
 parser.add_argument('--index_specified_mode', default=0, type=int)
 parser.add_argument('--page_specific_mode', default=0, type=int)
 parser.add_argument('--index_for_ps_mode', default=-1, type=int)
 parser.add_argument('--part_for_ps_mode', default=0, type=int)
+parser.add_argument('--parse_mode', choices=['webdriver', 'snapshot'], default='webdriver')
+parser.add_argument('--page_concurrency', default=1, type=int)
+
+# Retry Options
+parser.add_argument('--max_retries', default=3, type=int)
+parser.add_argument('--retry_base_delay', default=30, type=float)
+parser.add_argument('--retry_budget', default=0, type=int)
+parser.add_argument('--blocked_cooldown', default=600, type=float)
 
 # Log Options
 parser.add_argument('--verbose', default=1, type=int)
+parser.add_argument('--metrics_file', default='', type=str)
 
 # Dataset Option
 parser.add_argument('--target_list_name', default='User_List', type=str)
+parser.add_argument('--load_chunk_rows', default=100000, type=int)
 
 # AWS Options
 parser.add_argument('--aws_mode', default=0, type=int)
 parser.add_argument('--bucket_name', default='', type=str)
+parser.add_argument('--upload_part_mb', default=8, type=int)
 
 # Chrome Option
 parser.add_argument('--open_chrome', default=0, type=int)
+parser.add_argument('--recycle_driver_pages', default=0, type=int)
+parser.add_argument('--max_driver_rss_mb', default=0, type=int)
+parser.add_argument('--block_resources', default=0, type=int)
+parser.add_argument('--blocked_resource_types', default='image, font, media', type=str)
+parser.add_argument('--block_third_party', default=1, type=int)
+parser.add_argument('--page_load_strategy', choices=['normal', 'eager'], default='normal')
+
+# Fetch Options
+parser.add_argument('--fetch_engine', choices=['selenium', 'http'], default='selenium')
+parser.add_argument('--base_url', default='https://www.yelp.com', type=str)
+parser.add_argument('--http_pool_size', default=10, type=int)
+
+# Cache Options
+parser.add_argument('--page_cache_dir', default='', type=str)
+parser.add_argument('--page_cache_ttl_hours', default=0, type=float)
+parser.add_argument('--page_cache_max_mb', default=0, type=int)
+parser.add_argument('--replay', default=0, type=int)
+
+# Parallel Option
+parser.add_argument('--workers', default=1, type=int)
+parser.add_argument('--pipeline_mode', default=0, type=int)
+parser.add_argument('--split_page_threshold', default=0, type=int)
+parser.add_argument('--split_chunk_pages', default=50, type=int)
+
+# Queue Options
+parser.add_argument('--queue_mode', default=0, type=int)
+parser.add_argument('--queue_path', default='yelp_queue.db', type=str)
+parser.add_argument('--queue_name', default='', type=str)
+parser.add_argument('--lease_batch', default=5, type=int)
+parser.add_argument('--lease_seconds', default=600, type=int)
+parser.add_argument('--heartbeat_seconds', default=60, type=int)
+parser.add_argument('--queue_max_attempts', default=3, type=int)
+parser.add_argument('--node_id', default='', type=str)
 
 # Save Option
 parser.add_argument('--index_suffix', default=1, type=int)
 parser.add_argument('--save_failed_list', default=0, type=int)
+parser.add_argument('--streaming_mode', default=0, type=int)
+parser.add_argument('--chunk_size', default=10, type=int)
+parser.add_argument('--output_format', choices=['csv', 'parquet'], default='csv')
+parser.add_argument('--parquet_compression', choices=['zstd', 'snappy', 'gzip', 'none'], default='zstd')
+parser.add_argument('--row_group_size', default=100000, type=int)
+
+# Resume Options
+parser.add_argument('--journal_mode', default=0, type=int)
+parser.add_argument('--journal_path', default='yelp_progress.db', type=str)
+
+# Incremental Options
+parser.add_argument('--incremental_mode', default=0, type=int)
+parser.add_argument('--watermark_path', default='yelp_watermarks.db', type=str)
+
+# Dedup Options
+parser.add_argument('--user_index_path', default='', type=str)
+parser.add_argument('--profile_fresh_days', default=30, type=float)
 
 args = parser.parse_args()
 
@@ -76,9 +156,32 @@ success_num = 0
 fail_num = 0
 fail_list = []
 invalid_object_list = []
+# Retries so far, per index and in total.
+retry_attempts = {}
+retry_num = 0
 reviews = {}
+# Page chunks of the businesses review_scraper has split, by index.
+split_units = {}
 profiles = {}
 restaurants = {}
+progress_journal = None
+lease_queue = None
+rate_controller = None
+# Threads with their own pacing (the profile stage of pipeline mode) keep their controller here.
+stage_local = threading.local()
+page_cache = None
+result_storage = None
+watermark_store = None
+pending_marks = {}
+user_index = None
+pending_users = {}
+profile_stage = None
+# The browsers of the page threads with their rate controllers, kept for the whole run and
+# reused for every business.
+page_managers = []
+stage_metrics = metrics.StageMetrics()
+run_metrics = metrics.StageMetrics()
+metrics_writer = None
 
 class DetectedAsRobotError(Exception):
     def __init__(self):
@@ -88,57 +191,246 @@ class DeletedUserError(Exception):
     def __init__(self):
         super().__init__('This user page has been deleted.')
 
-def res_scraper(driver, index, res):
+class DeletedBusinessError(Exception):
+    def __init__(self):
+        super().__init__('This business page has been deleted.')
+
+class EmptyReviewSectionError(Exception):
+    def __init__(self, url):
+        super().__init__('No review section has been loaded from ' + url)
+
+# How a failed object is handled: transient failures are retried with exponential backoff,
+# blocked ones after a cooldown, permanent ones never.
+TRANSIENT = 'transient'
+BLOCKED = 'blocked'
+PERMANENT = 'permanent'
+TRANSIENT_ERRORS = (TimeoutException, WebDriverException, EmptyReviewSectionError) + fetchers.FETCH_ERRORS
+# WebDriverExceptions that come from the markup, not from the browser: the same page fails the
+# same way again. A page snapshot raises NoSuchElementException too.
+MARKUP_ERRORS = (NoSuchElementException, StaleElementReferenceException, InvalidSelectorException)
+
+def failure_class(e, index):
+    if index in invalid_object_list or isinstance(e, (DeletedUserError, DeletedBusinessError)):
+        return PERMANENT
+    if isinstance(e, (DetectedAsRobotError, fetchers.BlockedResponseError)):
+        return BLOCKED
+    if isinstance(e, MARKUP_ERRORS):
+        return PERMANENT
+    if isinstance(e, TRANSIENT_ERRORS):
+        return TRANSIENT
+    # Anything else (a page the parser does not understand, ...) fails the same way again.
+    return PERMANENT
+
+def schedule_retry(index, failure):
+    # Returns the delay before index (or (index, unit) for a work unit) is tried again, or None if it
+    # is not retried: the failure is permanent, or the retries of the object or the budget of the run
+    # are used up.
+    global retry_num
+    if failure == PERMANENT or retry_attempts.get(index, 0) >= args.max_retries or \
+            (args.retry_budget > 0 and retry_num >= args.retry_budget):
+        return None
+    retry_attempts[index] = retry_attempts.get(index, 0) + 1
+    retry_num += 1
+    if failure == BLOCKED:
+        return args.blocked_cooldown
+    return args.retry_base_delay * 2 ** (retry_attempts[index] - 1) * random.uniform(0.5, 1.5)
+
+def init_pacing():
+    global rate_controller
+    rate_controller = new_rate_controller((args.wait_time_for_next_page_lb + args.wait_time_for_next_page_ub) / 2)
+
+def new_rate_controller(initial_delay):
+    # None unless adaptive pacing is on.
+    if not args.adaptive_pacing:
+        return None
+    return pacing.RateController(logger, args.min_wait_time, args.max_wait_time, initial_delay)
+
+def init_page_cache():
+    global page_cache
+    if args.page_cache_dir != '':
+        page_cache = page_cache_module.PageCache(args.page_cache_dir, ttl=args.page_cache_ttl_hours * 3600,
+                                                 max_size_mb=args.page_cache_max_mb)
+
+def init_watermarks():
+    global watermark_store
+    if args.incremental_mode:
+        watermark_store = watermarks.WatermarkStore(args.watermark_path)
+
+def note_watermark(index, this_reviews):
+    # Keeps the newest review of a business until its records are safely stored.
+    if watermark_store is None or this_reviews is None:
+        return
+    records = list(zip(*this_reviews))
+    mark = watermarks.newest(records)
+    if mark is not None:
+        pending_marks[index] = (records[0][0], mark)
+
+def commit_watermarks(indices):
+    if watermark_store is None:
+        return
+    watermark_store.update([pending_marks.pop(index) for index in indices if index in pending_marks])
+
+def init_user_index():
+    global user_index
+    if args.user_index_path != '':
+        user_index = user_index_module.UserIndex(args.user_index_path)
+
+def note_users(index, record):
+    # Keeps the reviewers (review) or the user (profile) of a result until it is safely stored.
+    if user_index is None or record is None:
+        return
+    if args.collected_object == 'review':
+        pending_users[index] = set(record[utils.REVIEW_COLUMNS.index('user_id')])
+    elif args.collected_object == 'profile':
+        pending_users[index] = set([record[0]])
+
+def commit_users(indices):
+    if user_index is None:
+        return
+    user_ids = set()
+    for index in indices:
+        user_ids.update(pending_users.pop(index, []))
+    if args.collected_object == 'review':
+        user_index.add_seen(user_ids)
+    else:
+        user_index.mark_scraped(user_ids)
+
+def results_stored(indices):
+    # Called once the results of indices are on disk.
+    commit_watermarks(indices)
+    commit_users(indices)
+
+def init_metrics():
+    global metrics_writer
+    if args.metrics_file != '':
+        metrics_writer = metrics.MetricsWriter(args.metrics_file)
+
+def write_index_metrics(index, status, elapsed, worker_id='main'):
+    # One JSON line per finished index with the time it spent in each stage. The stages then
+    # start over for the next index and are added up for the summary line of the run.
+    run_metrics.merge(stage_metrics)
+    if metrics_writer is not None:
+        metrics_writer.write({'worker': worker_id, 'object': args.collected_object, 'index': int(index),
+                              'status': status, 'elapsed': round(elapsed, 6), 'stages': stage_metrics.snapshot()})
+    stage_metrics.reset()
+
+def write_run_metrics(worker_id='main'):
+    run_metrics.merge(stage_metrics)
+    if metrics_writer is not None:
+        metrics_writer.write({'worker': worker_id, 'object': args.collected_object, 'summary': True,
+                              'stages': run_metrics.snapshot()})
+        metrics_writer.close()
+
+def pacer():
+    return getattr(stage_local, 'rate_controller', rate_controller)
+
+def timings():
+    return getattr(stage_local, 'stage_metrics', stage_metrics)
+
+def cache_for_writing():
+    # Replayed pages come from the cache and are not written back.
+    return None if args.replay else page_cache
+
+def pause(lb, ub, previous_sleep_time=-1):
+    # Sleeps before reading a loaded page and returns the sleep time. A random time in [lb, ub],
+    # different from the previous one, unless the adaptive rate controller is on.
+    if args.replay:
+        return 0
+    with timings().stage('sleep'):
+        if pacer() is not None:
+            return pacer().wait()
+        sleep_time = random.randint(lb, ub)
+        while sleep_time == previous_sleep_time and lb < ub:
+            sleep_time = random.randint(lb, ub)
+        time.sleep(sleep_time)
+    return sleep_time
+
+# Clicks the "Read more" buttons of the review list, and only those. Returns how many it clicked.
+EXPAND_REVIEWS_SCRIPT = '''
+var buttons = arguments[0].querySelectorAll('ul > li button');
+var clicked = 0;
+for (var i = 0; i < buttons.length; i++) {
+    if (buttons[i].textContent.trim() === 'Read more') {
+        buttons[i].click();
+        clicked++;
+    }
+}
+return clicked;
+'''
+
+def click(button):
+    # Lets the browser settle before clicking; a replayed page has nothing to settle.
+    with timings().stage('click'):
+        if not args.replay:
+            time.sleep(0.1)
+        button.click()
+
+def expand_about_me(driver):
+    # Clicks "Show more" of "More about me" and tells whether the section is expanded now. A page
+    # snapshot (HTTP, replay) ignores the click, so its markup keeps the button and stays collapsed.
+    show_more_text_element = driver.find_elements(By.XPATH, './/p[text()="Show more"]')
+    if len(show_more_text_element) == 0:
+        return False
+    click(show_more_text_element[0].find_element(By.XPATH, 'ancestor::button[1]'))
+    return len(driver.find_elements(By.XPATH, './/p[text()="Show more"]')) == 0
+
+def load_page(manager, url):
+    with timings().stage('fetch'):
+        try:
+            manager.load(url)
+        except fetchers.BlockedResponseError:
+            if pacer() is not None:
+                pacer().on_blocked()
+            raise
+
+def res_scraper(manager, index, res):
     logger.error('In Fixing...')
 
-def profile_scraper(driver, index, reviewer, info_dict):
+def profile_scraper(manager, index, reviewer, info_dict):
     logger.info('Current working index: {}, User ID: {}'.format(str(index), reviewer['userid']))
-    reset_configuration = False
+    driver = manager.get()
 
-    url = 'https://www.yelp.com/user_details?userid=' + reviewer['userid']
+    url = args.base_url + '/user_details?userid=' + reviewer['userid']
     max_attempt = 10
     attempt_num = 0
     while attempt_num < max_attempt:
         try:
-            driver.get(url)
+            load_page(manager, url)
             if args.additional_wait_time == 0:
-                time.sleep(args.wait_time_for_new_index)
+                pause(args.wait_time_for_new_index, args.wait_time_for_new_index)
             else:
-                random_sleep_within_page = random.randint(1, args.additional_wait_time)
-                time.sleep(random_sleep_within_page)
+                pause(1, args.additional_wait_time)
             break
         except TimeoutException:
             logger.error('Oops.. Timeout! Reconfiguring webdriver...')
-            chrome_options = webdriver.ChromeOptions()
-            driver.set_page_load_timeout(10)
-            if platform.system() != 'Windows' or args.open_chrome == 0:
-                chrome_options.add_argument('--headless')
-                chrome_options.add_argument('--no-sandbox')
-                chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('log-level=3')
-
-            driver = webdriver.Chrome(options=chrome_options)
-            stealth(driver,
-                    languages=["en-US", "en"],
-                    vendor="Google Inc.",
-                    platform="Win32",
-                    webgl_vendor="Intel Inc.",
-                    renderer="Intel Iris OpenGL Engine",
-                    fix_hairline=True,
-                    )
+            if pacer() is not None:
+                pacer().on_timeout()
+            driver = manager.recycle()
             attempt_num = attempt_num + 1
             logger.info('Done. Attempt #: {}/10'.format(attempt_num))
-            reset_configuration = True
 
     if attempt_num == max_attempt:
         logger.error('Max attempt has reached. Something goes wrong...')
-        raise
+        raise TimeoutException('Cannot load ' + url)
     
     error_404 = len(driver.find_elements(By.XPATH, './/h1[contains(text(), \"We’re sorry. Something went wrong on this page.\")]')) > 0
     if error_404:
         invalid_object_list.append(index)
         raise DeletedUserError
 
+    with timings().stage('extract'):
+        if args.parse_mode == 'snapshot':
+            expanded = expand_about_me(driver)
+            this_profile = parsers.parse_profile_page(driver.page_source, reviewer['userid'], info_dict,
+                                                      expanded=expanded)
+        else:
+            this_profile = extract_profile(driver, reviewer, info_dict)
+    with timings().stage('build'):
+        profiles[index] = this_profile
+    if pacer() is not None:
+        pacer().on_success()
+
+def extract_profile(driver, reviewer, info_dict):
     cdt_id_name_list = info_dict['cdt_id_name']
     me_list = info_dict['about_me']
 
@@ -256,6 +548,7 @@ def profile_scraper(driver, index, reviewer, info_dict):
         compliments_dict[id_name] = 0
     child_compliments_elements = driver.find_elements(By.XPATH, './/p[text()="Compliments"]')
     if len(child_compliments_elements) > 0:
+        for id_name in cdt_id_name_list:
             this_compliment_element = driver.find_elements(By.XPATH,
                                                            ".//div[@data-testid=\"impact-compliment-" + id_name + "\"]")
             if len(this_compliment_element) > 0:
@@ -355,15 +648,11 @@ def profile_scraper(driver, index, reviewer, info_dict):
     me_dict = {}
     for me_info in me_list:
         me_dict[me_info] = ''
-    show_more_text_element = driver.find_elements(By.XPATH, './/p[text()="Show more"]')
-    if len(show_more_text_element) > 0:
-        button = show_more_text_element[0].find_element(By.XPATH, 'ancestor::button[1]')
-        time.sleep(0.1)
-        button.click()
+    expanded = expand_about_me(driver)
 
     me_title_element = driver.find_elements(By.XPATH, './/h3[text()="More about me"]')
     if len(me_title_element) > 0:
-        if len(show_more_text_element) > 0:
+        if expanded:
             me_info_elements = me_title_element[0].find_elements(By.XPATH, '../following-sibling::div[1]/div/div/div')
         else:
             me_info_elements = me_title_element[0].find_elements(By.XPATH, '../following-sibling::div[1]/div')
@@ -408,60 +697,332 @@ def profile_scraper(driver, index, reviewer, info_dict):
                     me_dict['The Last Great Book I Read'], me_dict['My First Concert'], me_dict['My Favorite Movie'],
                     me_dict['My Last Meal On Earth'], me_dict['Don’t Tell Anyone Else But...'],
                     me_dict['Most Recent Discovery'], me_dict['Current Crush']]
-    profiles[index] = this_profile
-    return reset_configuration
+    return this_profile
+
+def extract_review(review_element, yelpid, yelp_name):
+    user_info_element = review_element.find_element(By.XPATH, './/div[contains(@class, "user-passport-info")]')
+    user_name = user_info_element.find_element(By.XPATH, './span/a').text
+    user_id = user_info_element.find_element(By.XPATH, './span/a').get_attribute('href').split('?')[1].replace(
+        'userid=', '')
+    user_elite_element = user_info_element.find_elements(By.XPATH, './/div[contains(@class, "elite-badge")]')
+    if len(user_elite_element) > 0:
+        user_elite = 1
+        user_loc_element = user_info_element.find_elements(By.XPATH, './div[2]/div/span')
+        if len(user_loc_element) > 0:
+            user_loc = user_loc_element[0].text
+        else:
+            user_loc = ''
+    else:
+        user_elite = 0
+        user_loc_element = user_info_element.find_elements(By.XPATH, './div/div/span')
+        if len(user_loc_element) > 0:
+            user_loc = user_loc_element[0].text
+        else:
+            user_loc = ''
+    first_review_element = review_element.find_elements(By.XPATH, './/span[contains(text(), "First to Review")]')
+    user_first_review = 1 if len(first_review_element) > 0 else 0
+    # User Passport Stat
+    passport_stat = {}
+    passport_stat['Friends'] = 0
+    passport_stat['Reviews'] = 0
+    passport_stat['Photos'] = 0
+    user_passport_elements = review_element.find_element(By.XPATH,
+                                                         './/div[contains(@class, "user-passport-stat")]').find_elements(
+        By.XPATH, './div')
+    for stat_element in user_passport_elements:
+        passport_stat[stat_element.get_attribute('aria-label')] = int(
+            stat_element.find_element(By.XPATH, './span[2]/span').text)
+
+    rating_and_date_element = review_element.find_element(By.XPATH,
+                                                          './/div[contains(@aria-label, "star rating")]')
+    rating = int(rating_and_date_element.get_attribute('aria-label').split(' ')[0])
+    date = rating_and_date_element.find_element(By.XPATH, '../../following-sibling::div[1]').find_element(
+        By.XPATH, './span').text
+
+    updated_element = review_element.find_elements(By.XPATH, './/span[contains(text(), "Updated review")]')
+    if len(updated_element) > 0:
+        user_review_updated = 1
+    else:
+        user_review_updated = 0
 
-def review_scraper(driver, index, res, list_of_page=[]):
+    user_num_posted_photo_elements = review_element.find_elements(By.XPATH,
+                                                                  './/a[contains(@href, "biz_photos")]')
+    if len(user_num_posted_photo_elements) > 0:
+        if user_num_posted_photo_elements[0].text.find('See all photos from') != -1:
+            user_num_posted_photo = 0
+        else:
+            user_num_posted_photo = int(re.sub(r'[^0-9]', '', user_num_posted_photo_elements[0].text))
+    else:
+        user_num_posted_photo = 0
+
+    user_num_check_ins_element = review_element.find_elements(By.XPATH,
+                                                              './/span[text()="check-ins"]')
+    if len(user_num_check_ins_element) > 0:
+        user_num_check_ins = int(re.sub(r'[^0-9]', '', user_num_check_ins_element[0].text))
+    else:
+        user_num_check_ins = 0
+
+    comment_elements = review_element.find_elements(By.XPATH, './/p[contains(@class, "comment")]')
+    comment_elements.reverse()
+    # first comment element is this reviewer's comment.
+    comment_element = comment_elements.pop()
+    comment = comment_element.find_element(By.XPATH, './span').text
+
+    helpful = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
+                                                                    './/div[contains(@aria-label, "Helpful")]').get_attribute(
+        'aria-label')))
+    thanks = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
+                                                                   './/div[contains(@aria-label, "Thanks")]').get_attribute(
+        'aria-label')))
+    love_this = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
+                                                                      './/div[contains(@aria-label, "Love this")]').get_attribute(
+        'aria-label')))
+    oh_no = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
+                                                                  './/div[contains(@aria-label, "Oh no")]').get_attribute(
+        'aria-label')))
+
+    owner_comment = ''
+    owner_comment_date = ''
+    previous_ratings = ''
+    previous_dates = ''
+    previous_comments = ''
+    previous_helpfuls = ''
+    previous_thankss = ''
+    previous_love_thiss = ''
+    previous_oh_nos = ''
+    previous_rating_list = []
+    previous_dates_list = []
+    previous_comment_list = []
+    previous_helpful_list = []
+    previous_thanks_list = []
+    previous_love_this_list = []
+    previous_oh_no_list = []
+    # More than one comment: Owner's reply or previous comments.
+    # Second comment element is owner comment if exist
+    if len(comment_elements) > 0:
+        if len(review_element.find_elements(By.XPATH,
+                                            './/div[contains(@aria-labelledby, "businessOwner")]')) > 0:
+            owner_comment_element = comment_elements.pop()
+            owner_comment = owner_comment_element.find_element(By.XPATH, './span').text
+            owner_comment_date = owner_comment_element.find_element(By.XPATH, './preceding-sibling::div/p').text
+
+        if len(comment_elements) > 0:
+            for previous_comment_element in comment_elements:
+                previous_comment = previous_comment_element.find_element(By.XPATH, './span').text
+
+                previous_rating_and_date_element = previous_comment_element.find_element(By.XPATH,
+                                                                                         '../../../../preceding-sibling::div[1]/div[1]/div/div')
+                previous_rating = re.sub(r'[^0-9]', '', previous_rating_and_date_element.find_element(By.XPATH,
+                                                                                                      './div[1]/span/div').get_attribute(
+                    'aria-label'))
+                previous_date = previous_rating_and_date_element.find_element(By.XPATH, './div[2]/span[1]').text
+                if len(previous_comment_element.find_element(By.XPATH,
+                                                             '../following-sibling::div[1]').find_elements(
+                        By.XPATH, './/span[contains(text(), "Helpful")]')) > 0:
+                    previous_comment_helpfuls = previous_comment_element.find_elements(By.XPATH,
+                                                                                       '../following-sibling::div[1]/div/div/div')
+                else:
+                    previous_comment_helpfuls = previous_comment_element.find_elements(By.XPATH,
+                                                                                       '../following-sibling::div[2]/div/div/div')
+
+                previous_helpful = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[0].find_element(By.XPATH,
+                                                                                                    './div').get_attribute(
+                    'aria-label')))
+                previous_thanks = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[1].find_element(By.XPATH,
+                                                                                                   './div').get_attribute(
+                    'aria-label')))
+                previous_love_this = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[2].find_element(By.XPATH,
+                                                                                                      './div').get_attribute(
+                    'aria-label')))
+                previous_oh_no = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[3].find_element(By.XPATH,
+                                                                                                  './div').get_attribute(
+                    'aria-label')))
+
+                previous_comment_list.append(previous_comment)
+                previous_rating_list.append(previous_rating)
+                previous_dates_list.append(previous_date)
+
+                previous_helpful_list.append(previous_helpful)
+                previous_thanks_list.append(previous_thanks)
+                previous_love_this_list.append(previous_love_this)
+                previous_oh_no_list.append(previous_oh_no)
+
+            previous_ratings = ', '.join(previous_rating_list)
+            previous_dates = ', '.join(previous_dates_list)
+            previous_comments = ', '.join(previous_comment_list)
+            previous_helpfuls = ', '.join(previous_helpful_list)
+            previous_thankss = ', '.join(previous_thanks_list)
+            previous_love_thiss = ', '.join(previous_love_this_list)
+            previous_oh_nos = ', '.join(previous_oh_no_list)
+
+    return [yelpid, yelp_name, user_name, user_id, user_elite, user_first_review, user_loc,
+            passport_stat['Friends'], passport_stat['Reviews'], passport_stat['Photos'],
+            rating, date, user_review_updated, user_num_posted_photo, user_num_check_ins, comment,
+            helpful, thanks, love_this, oh_no, owner_comment_date, owner_comment,
+            previous_ratings, previous_dates, previous_comments, previous_helpfuls,
+            previous_thankss, previous_love_thiss, previous_oh_nos]
+
+def expand_reviews(driver, review_section):
+    # Opens every truncated comment of the page with one script call. Snapshots need no expansion:
+    # they read the markup, which always holds the full text.
+    if isinstance(driver, fetchers.SnapshotDriver):
+        return
+    with timings().stage('click'):
+        if driver.execute_script(EXPAND_REVIEWS_SCRIPT, review_section) > 0:
+            time.sleep(0.1)
+
+def collect_review_records(driver, review_section, review_elements, yelpid, yelp_name):
+    # Returns the records of the loaded review page, or None if the snapshot has no review section.
+    # A browser's page source holds the full comments only once they have been opened.
+    expand_reviews(driver, review_section)
+    with timings().stage('extract'):
+        if args.parse_mode == 'snapshot':
+            return parsers.parse_review_page(driver.page_source, yelpid, yelp_name)
+        return [extract_review(review_element, yelpid, yelp_name) for review_element in review_elements]
+
+def scrape_review_page(manager, index, yelpid, yelp_name, yelp_url, current_page):
+    # Loads one '?start=' page and returns its records ([] if the page is out of range or has no reviews).
+    # A page whose review section is still missing after a reload raises EmptyReviewSectionError.
+    driver = manager.get()
+    attempts = 0
+    while (attempts < 10):
+        try:
+            load_page(manager, yelp_url + current_page)
+            pause(args.wait_time_for_next_page_lb, args.wait_time_for_next_page_ub)
+            navigation_elements = driver.find_element(By.XPATH, './/div[@aria-label="Pagination navigation"]')
+            break
+        except TimeoutException:
+            attempts = attempts + 1
+            if pacer() is not None:
+                pacer().on_timeout()
+            logger.error('Failed to load the page... Refreshing... {}/10'.format(attempts))
+    if attempts == 10:
+        logger.error('Exceed max attempts... Something happens..')
+        raise TimeoutException('Cannot load ' + yelp_url + current_page)
+
+    page_text = navigation_elements.find_elements(By.XPATH, './div[2]/span')[0].text.split('of')
+    if int(page_text[0]) > int(page_text[1]):
+        logger.info('Index: {}, Page: {} is larger than total page number. Skipped.'.format(index, current_page))
+        return []
+
+    review_elements_f = driver.find_elements(By.XPATH, './/section[@aria-label="Recommended Reviews"]')
+    if len(review_elements_f) == 0:
+        logger.info('Oops.. Something goes wrong.. Reloading the page...')
+        if pacer() is not None:
+            pacer().on_empty()
+        load_page(manager, yelp_url + current_page)
+        pause(args.wait_time_for_next_page_lb, args.wait_time_for_next_page_ub)
+        review_elements_f = driver.find_elements(By.XPATH, './/section[@aria-label="Recommended Reviews"]')
+        if len(review_elements_f) == 0:
+            logger.info('Bad... Giving up on this business for now...')
+            raise EmptyReviewSectionError(yelp_url + current_page)
+    review_elements = review_elements_f[0].find_elements(By.XPATH, './div[2]/ul/li')
+    review_records = collect_review_records(driver, review_elements_f[0], review_elements, yelpid, yelp_name)
+    if pacer() is not None:
+        pacer().on_success()
+    return [] if review_records is None else review_records
+
+def page_manager_pool(size):
+    # The first size page browsers, started on first use.
+    while len(page_managers) < size:
+        page_managers.append((new_driver_manager(), new_rate_controller(
+            (args.wait_time_for_next_page_lb + args.wait_time_for_next_page_ub) / 2)))
+    return page_managers[:size]
+
+def close_page_managers():
+    for manager, _ in page_managers:
+        manager.quit()
+    del page_managers[:]
+
+def scrape_pages_concurrently(index, yelpid, yelp_name, yelp_url, list_of_page):
+    # Spreads the pages over args.page_concurrency browsers, each pacing itself. Yields (page, records)
+    # in the order the workers finish them; an error on any page fails the whole business.
+    stop_event = threading.Event()
+
+    def page_worker(manager, controller, worker_pages):
+        stage_local.rate_controller = controller
+        manager.checkpoint()
+        results = []
+        for current_page in worker_pages:
+            if stop_event.is_set():
+                break
+            logger.info('Current Index: {}, Thread: {}, Acutal Page: {}'.format(
+                str(index), threading.current_thread().name, current_page))
+            results.append((current_page, scrape_review_page(manager, index, yelpid, yelp_name, yelp_url,
+                                                             current_page)))
+        return results
+
+    concurrency = min(args.page_concurrency, len(list_of_page))
+    managers = page_manager_pool(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='page') as executor:
+        futures = [executor.submit(page_worker, managers[i][0], managers[i][1], list_of_page[i::concurrency])
+                   for i in range(concurrency)]
+        try:
+            for future in as_completed(futures):
+                for page_key, review_records in future.result():
+                    yield page_key, review_records
+        finally:
+            stop_event.set()
+
+def review_chunk_scraper(manager, index, res, pages, cancelled=None):
+    # Scrapes one work unit of a split business and returns its reviews, one list per column, or
+    # None if the business is cancelled in the meantime.
+    this_reviews = [[] for _ in utils.REVIEW_COLUMNS]
+    yelp_url = res['scrapedurl'].replace('https://www.yelp.com', args.base_url)
+    start = timer()
+    for page_num, current_page in enumerate(pages, 1):
+        if cancelled is not None and index in cancelled:
+            logger.info('Index: {}: The business has failed. The rest of the unit is skipped.'.format(index))
+            return None
+        logger.info('Current Index: {}, Page: {} / {} of the unit, Acutal Page: {}'.format(
+            str(index), str(page_num), str(len(pages)), current_page))
+        add_review_page(this_reviews, index, current_page,
+                        scrape_review_page(manager, index, res['yelpid'], res['name'], yelp_url, current_page))
+    logger.info('[{}]: Unit done. {} reivews have been collected.'.format(res['yelpid'], len(this_reviews[0])))
+    logger.info('Elapsed Time: ' + str(timedelta(seconds=(timer() - start))))
+    return this_reviews
+
+def add_review_page(this_reviews, index, page_key, review_records):
+    # Appends the records of one page column by column and keeps them in the journal.
+    with timings().stage('build'):
+        for review_record in review_records:
+            for column, value in zip(this_reviews, review_record):
+                column.append(value)
+        if progress_journal is not None:
+            progress_journal.save_page(index, page_key, review_records)
+
+def review_scraper(manager, index, res, list_of_page=[]):
+    driver = manager.get()
     previous_sleep_time = -1
     previous_sleep_time_within_page = -1
 
-    yelpid_list = []
-    yelp_name_list = []
-    user_name_list = []
-    user_id_list = []
-    user_elite_list = []
-    user_first_review_list = []
-    user_loc_list = []
-    user_friend_num_list = []
-    user_review_num_list = []
-    user_photos_num_list = []
-    rating_list = []
-    date_list = []
-    user_review_updated_list = []
-    user_num_posted_photo_list = []
-    user_num_check_ins_list = []
-    comment_list = []
-    helpful_list = []
-    thanks_list = []
-    love_this_list = []
-    oh_no_list = []
-    owner_comment_date_list = []
-    owner_comment_list = []
-    previous_ratings_list = []
-    previous_datess_list = []
-    previous_comments_list = []
-    previous_helpfuls_list = []
-    previous_thankss_list = []
-    previous_love_thiss_list = []
-    previous_oh_nos_list = []
+    # One list per column of utils.REVIEW_COLUMNS
+    this_reviews = [[] for _ in utils.REVIEW_COLUMNS]
 
     yelpid = res['yelpid']
     yelp_name = res['name']
-    yelp_url = res['scrapedurl']
+    yelp_url = res['scrapedurl'].replace('https://www.yelp.com', args.base_url)
+    # Incremental mode walks the pages newest first and stops at the first review seen before.
+    mark = None
+    first_page = ''
+    if watermark_store is not None:
+        mark = watermark_store.get(yelpid)
+        first_page = '?sort_by=date_desc'
     if len(list_of_page) > 0 and args.part_for_ps_mode > 1:
         start_page = list_of_page.pop()
-        driver.get(yelp_url + start_page)
+        load_page(manager, yelp_url + start_page)
     else:
-        driver.get(yelp_url)
+        load_page(manager, yelp_url + first_page)
 
     detected_as_robot = driver.find_elements(By.XPATH, './/h2[contains(text(), "Hey there! Before you continue")]')
     if len(detected_as_robot) > 0:
+        if pacer() is not None:
+            pacer().on_blocked()
         raise DetectedAsRobotError
-    random_sleep = random.randint(3, args.wait_time_for_new_index)
-    while random_sleep == previous_sleep_time:
-        random_sleep = random.randint(3, time.sleep(args.wait_time_for_new_index))
-    time.sleep(random_sleep)
-    previous_sleep_time = random_sleep
+    if len(driver.find_elements(By.XPATH, './/h1[contains(text(), "We’re sorry. Something went wrong on this page.")]')) > 0:
+        invalid_object_list.append(index)
+        raise DeletedBusinessError
+    previous_sleep_time = pause(3, args.wait_time_for_new_index, previous_sleep_time)
 
     start = timer()
     logger.info('Index: {}. Yelp ID: {}'.format(index, yelpid))
@@ -471,10 +1032,35 @@ def review_scraper(driver, index, res, list_of_page=[]):
         total_page = int(navigation_elements[0].find_elements(By.XPATH, './div[2]/span')[0].text.split('of')[1])
 
     if args.page_specific_mode == 0:
-        if total_page > 1:
-            list_of_page = ['?start=' + str(i * 10) for i in random.sample(range(1, total_page), total_page - 1)]
+        if total_page > 1 and mark is not None:
+            # pop() takes the pages from the end of the list, so the newest page goes last.
+            list_of_page = [first_page + '&start=' + str(i * 10) for i in range(total_page - 1, 0, -1)]
+        elif total_page > 1:
+            list_of_page = [first_page + ('&' if first_page != '' else '?') + 'start=' + str(i * 10)
+                            for i in random.sample(range(1, total_page), total_page - 1)]
     loaded_page_num = len(list_of_page) + 1
     total_review_num = 0
+    first_page_key = start_page if args.page_specific_mode == 1 and args.part_for_ps_mode > 1 else 'Home'
+
+    # Resume the pages a previous run has already finished for this business.
+    saved_pages = {}
+    if progress_journal is not None:
+        saved_pages = progress_journal.load_pages(index)
+        if len(saved_pages) > 0:
+            list_of_page = [p for p in list_of_page if p not in saved_pages]
+            for saved_records in saved_pages.values():
+                total_review_num = total_review_num + len(saved_records)
+                for review_record in saved_records:
+                    for column, value in zip(this_reviews, review_record):
+                        column.append(value)
+            logger.info('Resuming index {}: {} pages have already been collected.'.format(index, len(saved_pages)))
+    if args.split_page_threshold > 0 and total_page > args.split_page_threshold and len(list_of_page) > 0:
+        # Only the first page is scraped here; the rest becomes work units for the other workers.
+        split_units[index] = utils.balanced_chunks(list_of_page, args.split_chunk_pages)
+        logger.info('Index: {} has {} pages. The other {} pages are split into {} work units.'.format(
+            index, total_page, len(list_of_page), len(split_units[index])))
+        list_of_page = []
+        loaded_page_num = 1
     page = 0
     while (True):
         page = page + 1
@@ -493,21 +1079,21 @@ def review_scraper(driver, index, res, list_of_page=[]):
             attempts = 0
             while (attempts < 10):
                 try:
-                    driver.get(yelp_url + current_page)
-                    random_sleep_within_page = random.randint(args.wait_time_for_next_page_lb, args.wait_time_for_next_page_ub)
-                    while random_sleep_within_page == previous_sleep_time_within_page:
-                        random_sleep_within_page = random.randint(args.wait_time_for_next_page_lb, args.wait_time_for_next_page_ub)
-                    time.sleep(random_sleep_within_page)
-                    previous_sleep_time_within_page = random_sleep_within_page
+                    load_page(manager, yelp_url + current_page)
+                    previous_sleep_time_within_page = pause(args.wait_time_for_next_page_lb,
+                                                            args.wait_time_for_next_page_ub,
+                                                            previous_sleep_time_within_page)
                     navigation_elements = driver.find_element(By.XPATH, './/div[@aria-label="Pagination navigation"]')
                     break
                 except TimeoutException:
                     attempts = attempts + 1
                     logger.error('Failed to load the page... Refreshing... {}/10'.format(attempts))
+                    if pacer() is not None:
+                        pacer().on_timeout()
             
             if attempts == 10:
                 logger.error('Exceed max attempts... Something happens..')
-                raise
+                raise TimeoutException('Cannot load ' + yelp_url + current_page)
             
             current_page_num = int(navigation_elements.find_elements(By.XPATH, './div[2]/span')[0].text.split('of')[0])
             this_total_page_num = int(
@@ -519,21 +1105,20 @@ def review_scraper(driver, index, res, list_of_page=[]):
         review_elements_f = driver.find_elements(By.XPATH, './/section[@aria-label="Recommended Reviews"]')
         if len(review_elements_f) == 0:
             logger.info('Oops.. Something goes wrong.. Reloading the page...')
+            if pacer() is not None:
+                pacer().on_empty()
             if page > 1:
-                driver.get(yelp_url + current_page)
+                load_page(manager, yelp_url + current_page)
             else:
-                driver.get(yelp_url)
-            random_sleep_within_page = random.randint(args.wait_time_for_next_page_lb, args.wait_time_for_next_page_ub)
-            while random_sleep_within_page == previous_sleep_time_within_page:
-                random_sleep_within_page = random.randint(args.wait_time_for_next_page_lb,
-                                                          args.wait_time_for_next_page_ub)
-            time.sleep(random_sleep_within_page)
-            previous_sleep_time_within_page = random_sleep_within_page
+                load_page(manager, yelp_url + first_page)
+            previous_sleep_time_within_page = pause(args.wait_time_for_next_page_lb,
+                                                    args.wait_time_for_next_page_ub,
+                                                    previous_sleep_time_within_page)
 
             review_elements_f = driver.find_elements(By.XPATH, './/section[@aria-label="Recommended Reviews"]')
             if len(review_elements_f) == 0:
-                logger.info('Bad... Moving to next...')
-                break
+                logger.info('Bad... Giving up on this business for now...')
+                raise EmptyReviewSectionError(yelp_url + (current_page if page > 1 else first_page))
             else:
                 review_elements = review_elements_f[0].find_elements(By.XPATH, './div[2]/ul/li')
                 num_loaded_reviews = len(review_elements)
@@ -548,213 +1133,51 @@ def review_scraper(driver, index, res, list_of_page=[]):
                 break
 
         total_review_num = total_review_num + num_loaded_reviews
-        for review_element in review_elements:
-            read_more_elements = review_element.find_elements(By.XPATH, './/button')
-            for read_more_button in read_more_elements:
-                time.sleep(0.1)
-                read_more_button.click()
-
-            user_info_element = review_element.find_element(By.XPATH, './/div[contains(@class, "user-passport-info")]')
-            user_name = user_info_element.find_element(By.XPATH, './span/a').text
-            user_id = user_info_element.find_element(By.XPATH, './span/a').get_attribute('href').split('?')[1].replace(
-                'userid=', '')
-            user_elite_element = user_info_element.find_elements(By.XPATH, './/div[contains(@class, "elite-badge")]')
-            if len(user_elite_element) > 0:
-                user_elite = 1
-                user_loc_element = user_info_element.find_elements(By.XPATH, './div[2]/div/span')
-                if len(user_loc_element) > 0:
-                    user_loc = user_loc_element[0].text
-                else:
-                    user_loc = ''
-            else:
-                user_elite = 0
-                user_loc_element = user_info_element.find_elements(By.XPATH, './div/div/span')
-                if len(user_loc_element) > 0:
-                    user_loc = user_loc_element[0].text
-                else:
-                    user_loc = ''
-            first_review_element = review_element.find_elements(By.XPATH, './/span[contains(text(), "First to Review")]')
-            user_first_review = 1 if len(first_review_element) > 0 else 0
-            # User Passport Stat
-            passport_stat = {}
-            passport_stat['Friends'] = 0
-            passport_stat['Reviews'] = 0
-            passport_stat['Photos'] = 0
-            user_passport_elements = review_element.find_element(By.XPATH,
-                                                                 './/div[contains(@class, "user-passport-stat")]').find_elements(
-                By.XPATH, './div')
-            for stat_element in user_passport_elements:
-                passport_stat[stat_element.get_attribute('aria-label')] = int(
-                    stat_element.find_element(By.XPATH, './span[2]/span').text)
-
-            rating_and_date_element = review_element.find_element(By.XPATH,
-                                                                  './/div[contains(@aria-label, "star rating")]')
-            rating = int(rating_and_date_element.get_attribute('aria-label').split(' ')[0])
-            date = rating_and_date_element.find_element(By.XPATH, '../../following-sibling::div[1]').find_element(
-                By.XPATH, './span').text
-
-            updated_element = review_element.find_elements(By.XPATH, './/span[contains(text(), "Updated review")]')
-            if len(updated_element) > 0:
-                user_review_updated = 1
-            else:
-                user_review_updated = 0
+        review_records = collect_review_records(driver, review_elements_f[0], review_elements, yelpid, yelp_name)
+        if review_records is None:
+            logger.info('Bad... Moving to next...')
+            break
+        if pacer() is not None:
+            pacer().on_success()
+
+        reached_mark = False
+        if mark is not None:
+            new_records = [r for r in review_records if not watermarks.is_seen(mark, r)]
+            reached_mark = len(new_records) < len(review_records)
+            total_review_num = total_review_num - (len(review_records) - len(new_records))
+            review_records = new_records
+
+        page_key = first_page_key if page == 1 else current_page
+        if page_key in saved_pages:
+            total_review_num = total_review_num - num_loaded_reviews
+        else:
+            add_review_page(this_reviews, index, page_key, review_records)
 
-            user_num_posted_photo_elements = review_element.find_elements(By.XPATH,
-                                                                          './/a[contains(@href, "biz_photos")]')
-            if len(user_num_posted_photo_elements) > 0:
-                if user_num_posted_photo_elements[0].text.find('See all photos from') != -1:
-                    user_num_posted_photo = 0
-                else:
-                    user_num_posted_photo = int(re.sub(r'[^0-9]', '', user_num_posted_photo_elements[0].text))
-            else:
-                user_num_posted_photo = 0
+        if reached_mark:
+            logger.info('[{}]: Reached the reviews collected before. {} pages are skipped.'.format(
+                yelpid, len(list_of_page)))
+            list_of_page = []
 
-            user_num_check_ins_element = review_element.find_elements(By.XPATH,
-                                                                      './/span[text()="check-ins"]')
-            if len(user_num_check_ins_element) > 0:
-                user_num_check_ins = int(re.sub(r'[^0-9]', '', user_num_check_ins_element[0].text))
-            else:
-                user_num_check_ins = 0
-
-            comment_elements = review_element.find_elements(By.XPATH, './/p[contains(@class, "comment")]')
-            comment_elements.reverse()
-            # first comment element is this reviewer's comment.
-            comment_element = comment_elements.pop()
-            comment = comment_element.find_element(By.XPATH, './span').text
-
-            helpful = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
-                                                                            './/div[contains(@aria-label, "Helpful")]').get_attribute(
-                'aria-label')))
-            thanks = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
-                                                                           './/div[contains(@aria-label, "Thanks")]').get_attribute(
-                'aria-label')))
-            love_this = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
-                                                                              './/div[contains(@aria-label, "Love this")]').get_attribute(
-                'aria-label')))
-            oh_no = int(re.sub(r'[^0-9]', '', review_element.find_element(By.XPATH,
-                                                                          './/div[contains(@aria-label, "Oh no")]').get_attribute(
-                'aria-label')))
-
-            owner_comment = ''
-            owner_comment_date = ''
-            previous_ratings = ''
-            previous_dates = ''
-            previous_comments = ''
-            previous_helpfuls = ''
-            previous_thankss = ''
-            previous_love_thiss = ''
-            previous_oh_nos = ''
-            previous_rating_list = []
-            previous_dates_list = []
-            previous_comment_list = []
-            previous_helpful_list = []
-            previous_thanks_list = []
-            previous_love_this_list = []
-            previous_oh_no_list = []
-            # More than one comment: Owner's reply or previous comments.
-            # Second comment element is owner comment if exist
-            if len(comment_elements) > 0:
-                if len(review_element.find_elements(By.XPATH,
-                                                    './/div[contains(@aria-labelledby, "businessOwner")]')) > 0:
-                    owner_comment_element = comment_elements.pop()
-                    owner_comment = owner_comment_element.find_element(By.XPATH, './span').text
-                    owner_comment_date = owner_comment_element.find_element(By.XPATH, './preceding-sibling::div/p').text
-
-                if len(comment_elements) > 0:
-                    for previous_comment_element in comment_elements:
-                        previous_comment = previous_comment_element.find_element(By.XPATH, './span').text
-
-                        previous_rating_and_date_element = previous_comment_element.find_element(By.XPATH,
-                                                                                                 '../../../../preceding-sibling::div[1]/div[1]/div/div')
-                        previous_rating = re.sub(r'[^0-9]', '', previous_rating_and_date_element.find_element(By.XPATH,
-                                                                                                              './div[1]/span/div').get_attribute(
-                            'aria-label'))
-                        previous_date = previous_rating_and_date_element.find_element(By.XPATH, './div[2]/span[1]').text
-                        if len(previous_comment_element.find_element(By.XPATH,
-                                                                     '../following-sibling::div[1]').find_elements(
-                                By.XPATH, './/span[contains(text(), "Helpful")]')) > 0:
-                            previous_comment_helpfuls = previous_comment_element.find_elements(By.XPATH,
-                                                                                               '../following-sibling::div[1]/div/div/div')
-                        else:
-                            previous_comment_helpfuls = previous_comment_element.find_elements(By.XPATH,
-                                                                                               '../following-sibling::div[2]/div/div/div')
-
-                        previous_helpful = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[0].find_element(By.XPATH,
-                                                                                                            './div').get_attribute(
-                            'aria-label')))
-                        previous_thanks = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[1].find_element(By.XPATH,
-                                                                                                           './div').get_attribute(
-                            'aria-label')))
-                        previous_love_this = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[2].find_element(By.XPATH,
-                                                                                                              './div').get_attribute(
-                            'aria-label')))
-                        previous_oh_no = (re.sub(r'[^0-9]', '', previous_comment_helpfuls[3].find_element(By.XPATH,
-                                                                                                          './div').get_attribute(
-                            'aria-label')))
-
-                        previous_comment_list.append(previous_comment)
-                        previous_rating_list.append(previous_rating)
-                        previous_dates_list.append(previous_date)
-
-                        previous_helpful_list.append(previous_helpful)
-                        previous_thanks_list.append(previous_thanks)
-                        previous_love_this_list.append(previous_love_this)
-                        previous_oh_no_list.append(previous_oh_no)
-
-                    previous_ratings = ', '.join(previous_rating_list)
-                    previous_dates = ', '.join(previous_dates_list)
-                    previous_comments = ', '.join(previous_comment_list)
-                    previous_helpfuls = ', '.join(previous_helpful_list)
-                    previous_thankss = ', '.join(previous_thanks_list)
-                    previous_love_thiss = ', '.join(previous_love_this_list)
-                    previous_oh_nos = ', '.join(previous_oh_no_list)
-
-            yelpid_list.append(yelpid)
-            yelp_name_list.append(yelp_name)
-            user_name_list.append(user_name)
-            user_id_list.append(user_id)
-            user_elite_list.append(user_elite)
-            user_first_review_list.append(user_first_review)
-            user_loc_list.append(user_loc)
-            user_friend_num_list.append(passport_stat['Friends'])
-            user_review_num_list.append(passport_stat['Reviews'])
-            user_photos_num_list.append(passport_stat['Photos'])
-            rating_list.append(rating)
-            date_list.append(date)
-            user_review_updated_list.append(user_review_updated)
-            user_num_posted_photo_list.append(user_num_posted_photo)
-            user_num_check_ins_list.append(user_num_check_ins)
-            comment_list.append(comment)
-            helpful_list.append(helpful)
-            thanks_list.append(thanks)
-            love_this_list.append(love_this)
-            oh_no_list.append(oh_no)
-            owner_comment_date_list.append(owner_comment_date)
-            owner_comment_list.append(owner_comment)
-            previous_ratings_list.append(previous_ratings)
-            previous_datess_list.append(previous_dates)
-            previous_comments_list.append(previous_comments)
-            previous_helpfuls_list.append(previous_helpfuls)
-            previous_thankss_list.append(previous_thankss)
-            previous_love_thiss_list.append(previous_love_thiss)
-            previous_oh_nos_list.append(previous_oh_nos)
+        if page == 1 and args.page_concurrency > 1 and len(list_of_page) > 0:
+            for page_key, review_records in scrape_pages_concurrently(index, yelpid, yelp_name, yelp_url, list_of_page):
+                total_review_num = total_review_num + len(review_records)
+                add_review_page(this_reviews, index, page_key, review_records)
+            list_of_page = []
 
         if len(list_of_page) == 0:
             end = timer()
             global reviews
             logger.info("[{}]: Done. {} reivews have been collected.".format(yelpid, total_review_num))
             logger.info('Elapsed Time: ' + str(timedelta(seconds=(end - start))))
-            this_reviews = [yelpid_list, yelp_name_list, user_name_list, user_id_list, user_elite_list,
-                            user_first_review_list, user_loc_list, user_friend_num_list, user_review_num_list,
-                            user_photos_num_list, rating_list, date_list, user_review_updated_list,
-                            user_num_posted_photo_list, user_num_check_ins_list, comment_list, helpful_list,
-                            thanks_list, love_this_list, oh_no_list, owner_comment_date_list, owner_comment_list,
-                            previous_ratings_list, previous_datess_list, previous_comments_list, previous_helpfuls_list,
-                            previous_thankss_list, previous_love_thiss_list, previous_oh_nos_list]
             reviews[index] = this_reviews
             break
 
-def main(args, obj):
+def create_driver():
+    if args.replay:
+        return fetchers.ReplayDriver(page_cache)
+    if args.fetch_engine == 'http':
+        return fetchers.HttpDriver(pool_size=args.http_pool_size, timeout=10)
+
     chrome_options = webdriver.ChromeOptions()
     if platform.system() != 'Windows' or args.open_chrome == 0:
         chrome_options.add_argument('--headless')
@@ -762,12 +1185,20 @@ def main(args, obj):
         chrome_options.add_argument('--disable-dev-shm-usage')
     chrome_options.add_argument('log-level=3')
     chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    # 'eager' returns from get() at DOMContentLoaded instead of waiting for every subresource.
+    chrome_options.page_load_strategy = args.page_load_strategy
+    if args.block_resources == 1:
+        resource_types = [t.strip() for t in args.blocked_resource_types.split(',') if t.strip() != '']
+        chrome_options.add_experimental_option('prefs', resource_blocking.chrome_prefs(resource_types))
 
     if platform.system() == 'Windows':
         driver = webdriver.Chrome(options=chrome_options)
     else:
         driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
     driver.set_page_load_timeout(10)
+    if args.block_resources == 1:
+        resource_blocking.apply(driver, resource_blocking.blocked_url_patterns(resource_types,
+                                                                               args.block_third_party == 1))
     stealth(driver,
             languages=["en-US", "en"],
             vendor="Google Inc.",
@@ -776,30 +1207,475 @@ def main(args, obj):
             renderer="Intel Iris OpenGL Engine",
             fix_hairline=True,
             )
-    # Load restaurant list file.
-    if args.aws_mode:
-        yelp_target_df = pd.read_csv(io.BytesIO(obj['Body'].read()))
+    return driver
+
+def new_driver_manager():
+    return driver_manager.DriverManager(create_driver, logger, max_pages=args.recycle_driver_pages,
+                                        max_rss_mb=args.max_driver_rss_mb, page_cache=cache_for_writing())
+
+def scrape_object(manager, index, object, list_of_page, required_info_dict):
+    manager.checkpoint()
+    if args.collected_object == 'profile':
+        profile_scraper(manager, index, object, required_info_dict)
+    elif args.collected_object == 'review':
+        review_scraper(manager, index, object, list_of_page)
     else:
-        yelp_target_df = pd.read_csv(args.target_list_name + '.csv', encoding='utf-8')
+        res_scraper(manager, index, object)
+
+def store_result(writer, collected_objects, index):
+    # Returns the indices whose results are now safely on disk.
+    global success_num
+    if profile_stage is not None:
+        profile_stage.push(collected_objects.get(index))
+    note_watermark(index, collected_objects.get(index))
+    note_users(index, collected_objects.get(index))
+    if writer is None:
+        success_num += 1
+        return []
+    with timings().stage('build'):
+        finalized_list = writer.write(index, collected_objects.pop(index))
+        success_num += 1
+        if progress_journal is not None:
+            progress_journal.mark(finalized_list, journal.DONE)
+        results_stored(finalized_list)
+    return finalized_list
+
+def record_failure(index):
+    global fail_num
+    fail_num += 1
+    if not index in invalid_object_list:
+        fail_list.append(index)
+    if progress_journal is not None:
+        progress_journal.mark([index], journal.DELETED if index in invalid_object_list else journal.FAILED)
+
+def worker_main(worker_id, task_queue, result_queue, required_info_dict, run_key, cancelled=None):
+    # Scrapes the objects of task_queue with its own browser and sends every outcome to result_queue.
+    # cancelled holds the split businesses that have failed; their remaining units are skipped.
+    global progress_journal
+    random.seed()
+    init_pacing()
+    init_page_cache()
+    init_watermarks()
+    init_metrics()
+    if run_key is not None:
+        progress_journal = journal.ProgressJournal(args.journal_path, run_key)
+    collected_objects = {'profile': profiles, 'review': reviews, 'restaurant': restaurants}[args.collected_object]
+    manager = new_driver_manager()
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            # unit is None for a whole object, or the number of a page chunk of a split business.
+            index, object, unit, pages = task
+            if unit is not None and cancelled is not None and index in cancelled:
+                result_queue.put(('cancelled', worker_id, (index, unit), None))
+                continue
+            result_queue.put(('started', worker_id, (index, unit), None))
+            index_start = timer()
+            try:
+                if unit is not None:
+                    this_reviews = review_chunk_scraper(manager, index, object, pages, cancelled)
+                    if this_reviews is None:
+                        result_queue.put(('cancelled', worker_id, (index, unit), None))
+                    else:
+                        result_queue.put(('unit_done', worker_id, (index, unit), this_reviews))
+                else:
+                    scrape_object(manager, index, object, [], required_info_dict)
+                    if index in split_units:
+                        result_queue.put(('split', worker_id, (index, unit),
+                                          (collected_objects.pop(index), split_units.pop(index))))
+                    else:
+                        result_queue.put((journal.DONE, worker_id, (index, unit), collected_objects.pop(index)))
+                write_index_metrics(index, journal.DONE, timer() - index_start, worker_id)
+            except:
+                logger.error(traceback.format_exc())
+                logger.error('Worker ' + str(worker_id) + ', Index ' + str(index) + ': Error occured.')
+                state = journal.DELETED if index in invalid_object_list else journal.FAILED
+                result_queue.put((state, worker_id, (index, unit), failure_class(sys.exc_info()[1], index)))
+                write_index_metrics(index, state, timer() - index_start, worker_id)
+    finally:
+        manager.quit()
+        close_page_managers()
+        if page_cache is not None:
+            page_cache.close()
+        write_run_metrics(worker_id)
+        result_queue.put(('exited', worker_id, None, None))
+
+def finalize_results(writer):
+    # Puts the open chunk on disk and marks its objects as done.
+    finalized_list = writer.finalize_chunk()
+    if progress_journal is not None:
+        progress_journal.mark(finalized_list, journal.DONE)
+    results_stored(finalized_list)
+    if lease_queue is not None:
+        lease_queue.complete(finalized_list, journal.DONE)
+
+def run_queue(manager, targets, list_of_page, required_info_dict, writer, collected_objects):
+    # Scrapes the targets this node leases from the shared queue until no task is left. A target
+    # is completed in the queue only once its chunk is on disk; until then the heartbeat keeps
+    # its lease alive. Returns the number of targets this node has worked on.
+    lease_queue.start_heartbeat(args.heartbeat_seconds, logger)
+    worked_num = 0
+    while True:
+        batch = [int(task) for task in lease_queue.lease(args.lease_batch)]
+        if len(batch) == 0:
+            # The targets of the open chunk are still leased by this node.
+            finalize_results(writer)
+            if lease_queue.unfinished_num() == 0:
+                break
+            logger.info('Every remaining target is leased by another node or waits for its retry. Waiting...')
+            time.sleep(args.heartbeat_seconds)
+            continue
+        logger.info('Leased {} targets ({} reissued after their lease expired): {}'.format(
+            len(batch), lease_queue.reissued_num, ', '.join(map(str, batch))))
+        for index in batch:
+            worked_num += 1
+            index_start = timer()
+            try:
+                scrape_object(manager, index, targets[index], list_of_page, required_info_dict)
+                lease_queue.complete(store_result(writer, collected_objects, index), journal.DONE)
+                write_index_metrics(index, journal.DONE, timer() - index_start)
+            except:
+                logger.error(traceback.format_exc())
+                state = journal.DELETED if index in invalid_object_list else journal.FAILED
+                failure = failure_class(sys.exc_info()[1], index)
+                delay = schedule_retry(index, failure)
+                # Only a target that will not be tried again counts as failed.
+                if delay is None:
+                    lease_queue.complete([index], state)
+                    record_failure(index)
+                    logger.error('Index {}: {} failure. This target gets skipped.'.format(index, failure))
+                elif lease_queue.fail(index, delay=delay):
+                    state = 'retry'
+                    logger.warning('Index {}: {} failure. It goes back to the queue for a retry in {:.0f}s.'.format(
+                        index, failure, delay))
+                    if failure == BLOCKED:
+                        # Every target would be blocked too; this node waits.
+                        time.sleep(delay)
+                else:
+                    record_failure(index)
+                    logger.error('Index ' + str(index) + ': Error occured. No attempt is left.')
+                write_index_metrics(index, state, timer() - index_start)
+    return worked_num
+
+def run_workers(targets, required_info_dict, run_key, writer, collected_objects):
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for index, object in targets.items():
+        task_queue.put((index, object, None, None))
+    # Split businesses add tasks while the run goes on, so the workers are only told to stop
+    # once no task is left.
+    outstanding = len(targets)
+    # index -> the records of the first page and of every unit (None until it is done), by unit.
+    split_objects = {}
+    # index -> the pages of every unit, by unit - 1.
+    split_chunks = {}
+    # Split businesses given up on, shared with the workers so they drop the remaining units.
+    sync_manager = None
+    cancelled = None
+    if args.split_page_threshold > 0:
+        sync_manager = multiprocessing.Manager()
+        cancelled = sync_manager.dict()
+
+    def fail_task(index, unit):
+        if unit is None:
+            record_failure(index)
+        elif index in split_objects:
+            # A unit out of retries fails the whole business; its other units are cancelled.
+            del split_objects[index]
+            del split_chunks[index]
+            cancelled[index] = True
+            record_failure(index)
+
+    workers = []
+    for worker_id in range(args.workers):
+        worker = multiprocessing.Process(target=worker_main,
+                                         args=(worker_id, task_queue, result_queue, required_info_dict, run_key,
+                                               cancelled))
+        worker.start()
+        workers.append(worker)
+    logger.info(str(args.workers) + ' workers have been started.')
+    if outstanding == 0:
+        for _ in workers:
+            task_queue.put(None)
+
+    in_progress = {}
+    exited = set()
+    while len(exited) < len(workers):
+        try:
+            state, worker_id, task_id, record = result_queue.get(timeout=10)
+        except queue.Empty:
+            # A worker killed without reporting loses its current object.
+            for worker_id, worker in enumerate(workers):
+                if worker.exitcode not in [None, 0] and not worker_id in exited:
+                    logger.error('Worker ' + str(worker_id) + ' has died unexpectedly.')
+                    exited.add(worker_id)
+                    if worker_id in in_progress:
+                        fail_task(*in_progress.pop(worker_id))
+                        outstanding -= 1
+                        if outstanding == 0:
+                            for _ in workers:
+                                task_queue.put(None)
+            continue
+
+        if state == 'started':
+            in_progress[worker_id] = task_id
+        elif state == 'exited':
+            exited.add(worker_id)
+        elif state == 'cancelled':
+            outstanding -= 1
+        else:
+            in_progress.pop(worker_id, None)
+            index, unit = task_id
+            outstanding -= 1
+            if state == journal.DONE:
+                collected_objects[index] = record
+                store_result(writer, collected_objects, index)
+            elif state == 'split':
+                first_page, chunks = record
+                split_objects[index] = [first_page] + [None] * len(chunks)
+                split_chunks[index] = chunks
+                for unit, pages in enumerate(chunks, 1):
+                    task_queue.put((index, targets[index], unit, pages))
+                outstanding += len(chunks)
+            elif state == 'unit_done':
+                if index in split_objects:
+                    parts = split_objects[index]
+                    parts[unit] = record
+                    if all([part is not None for part in parts]):
+                        del split_objects[index]
+                        del split_chunks[index]
+                        merged = [[] for _ in utils.REVIEW_COLUMNS]
+                        for part in parts:
+                            for column, values in zip(merged, part):
+                                column.extend(values)
+                        logger.info('Index: {}: All {} work units are done. {} reviews have been collected.'.format(
+                            index, len(parts) - 1, len(merged[0])))
+                        collected_objects[index] = merged
+                        store_result(writer, collected_objects, index)
+            else:
+                if state == journal.DELETED:
+                    invalid_object_list.append(index)
+                # A unit is retried on its own, with its own count of attempts.
+                retry_key = index if unit is None else (index, unit)
+                delay = None
+                if unit is None or index in split_objects:
+                    delay = schedule_retry(retry_key, record)
+                if delay is not None:
+                    logger.warning('Index {}{}: {} failure. Retry {}/{} in {:.0f}s.'.format(
+                        index, '' if unit is None else ', Unit ' + str(unit), record, retry_attempts[retry_key],
+                        args.max_retries, delay))
+                    outstanding += 1
+                    pages = None if unit is None else split_chunks[index][unit - 1]
+                    threading.Timer(delay, task_queue.put, [(index, targets[index], unit, pages)]).start()
+                else:
+                    fail_task(index, unit)
+            if outstanding == 0:
+                for _ in workers:
+                    task_queue.put(None)
+
+    for worker in workers:
+        worker.join()
+    if sync_manager is not None:
+        sync_manager.shutdown()
+
+class ProfileStage:
+    # Pipeline mode: scrapes the profiles of the reviewers the review stage finds, on its own
+    # thread, browser, pacing and stage timings, while the review stage goes on. Each user is
+    # scraped once.
+    def __init__(self, writer):
+        self.writer = writer
+        self.stage_metrics = metrics.StageMetrics()
+        self.run_metrics = metrics.StageMetrics()
+        self.queue = queue.Queue()
+        self.seen = set()
+        self.results = {}
+        self.scraped = []
+        self.fail_list = []
+        self.deleted_list = []
+        self.thread = threading.Thread(target=self.run, name='profile', daemon=True)
+        self.thread.start()
+
+    def push(self, this_reviews):
+        if this_reviews is None:
+            return
+        user_ids = [user_id for user_id in dict.fromkeys(this_reviews[utils.REVIEW_COLUMNS.index('user_id')])
+                    if not user_id in self.seen]
+        self.seen.update(user_ids)
+        if user_index is not None:
+            fresh = user_index.fresh(user_ids, args.profile_fresh_days * 86400)
+            user_ids = [user_id for user_id in user_ids if not user_id in fresh]
+        for user_id in user_ids:
+            self.queue.put(user_id)
+
+    def run(self):
+        stage_local.rate_controller = new_rate_controller(args.wait_time_for_new_index)
+        stage_local.stage_metrics = self.stage_metrics
+        info_dict = {'cdt_id_name': utils.COMPLIMENT_IDS, 'about_me': utils.ABOUT_ME_TITLES}
+        with new_driver_manager() as manager:
+            while True:
+                user_id = self.queue.get()
+                if user_id is None:
+                    break
+                user_start = timer()
+                state = journal.DONE
+                try:
+                    manager.checkpoint()
+                    # Users are indexed by their ID so they do not mix with the review indices.
+                    profile_scraper(manager, user_id, {'userid': user_id}, info_dict)
+                    if self.writer is not None:
+                        self.writer.write(user_id, profiles.pop(user_id))
+                    else:
+                        self.results[user_id] = profiles.pop(user_id)
+                    self.scraped.append(user_id)
+                except DeletedUserError:
+                    invalid_object_list.remove(user_id)
+                    self.deleted_list.append(user_id)
+                    state = journal.DELETED
+                except:
+                    logger.error(traceback.format_exc())
+                    logger.error('User ' + user_id + ': Error occured. This profile gets skipped.')
+                    self.fail_list.append(user_id)
+                    state = journal.FAILED
+                self.write_metrics(user_id, state, timer() - user_start)
+
+    def write_metrics(self, user_id, status, elapsed):
+        # Like write_index_metrics(), in lines of their own tagged as the profile stage.
+        self.run_metrics.merge(self.stage_metrics)
+        if metrics_writer is not None:
+            metrics_writer.write({'worker': 'profile', 'object': 'profile', 'user_id': user_id, 'status': status,
+                                  'elapsed': round(elapsed, 6), 'stages': self.stage_metrics.snapshot()})
+        self.stage_metrics.reset()
+
+    def close(self):
+        # Waits until every queued user is done.
+        logger.info('Review stage is done. {} profiles are left to the profile stage.'.format(self.queue.qsize()))
+        self.queue.put(None)
+        self.thread.join()
+        if metrics_writer is not None:
+            metrics_writer.write({'worker': 'profile', 'object': 'profile', 'summary': True,
+                                  'stages': self.run_metrics.snapshot()})
+
+def safe_name(text):
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', text)
+
+def abort_uploads(prefix):
+    aborted = result_storage.abort_uploads(prefix)
+    if aborted > 0:
+        logger.info('Aborted {} unfinished uploads of '.format(aborted) + result_storage.location(prefix) +
+                    ' left by an earlier run.')
+
+def merge_queue_parts(parts_prefix, file_name):
+    # Queue mode: once no target is left, one node merges the chunks every node has put under
+    # parts_prefix into file_name. The merge is a lease too; if its node dies, the next node to
+    # finish (or to be started) merges. Returns whether this node has merged.
+    merge_queue = leases.open_queue(args.queue_path, lease_queue.queue_name + ':merge', lease_queue.owner,
+                                    args.lease_seconds, args.queue_max_attempts)
+    try:
+        merge_queue.populate(['merge'])
+        if len(merge_queue.lease(1)) == 0:
+            return False
+        merge_queue.start_heartbeat(args.heartbeat_seconds, logger)
+        try:
+            keys = result_storage.list(parts_prefix)
+            # Chunks and merges that dead nodes never finished uploading.
+            abort_uploads(parts_prefix)
+            abort_uploads(file_name)
+            logger.info('Merging the {} chunks of the queue...'.format(len(keys)))
+            if args.output_format == 'parquet':
+                frames = (pd.read_csv(result_storage.open_read(key), dtype=str, keep_default_na=False, encoding='utf-8')
+                          for key in keys)
+                # Staged under its own name: the local storage stages its copy under file_name + '.tmp'.
+                utils.write_parquet(frames, file_name + '.merge', args.collected_object, args.parquet_compression,
+                                    args.row_group_size)
+                result_storage.put_file(file_name, file_name + '.merge')
+                os.remove(file_name + '.merge')
+            else:
+                upload = result_storage.open_upload(file_name)
+                try:
+                    for i, key in enumerate(keys):
+                        f = result_storage.open_read(key)
+                        if i > 0:
+                            f.readline()
+                        while True:
+                            data = f.read(1024 * 1024)
+                            if len(data) == 0:
+                                break
+                            upload.write(data)
+                        f.close()
+                    upload.complete()
+                except:
+                    upload.abort()
+                    raise
+            for key in keys:
+                result_storage.delete(key)
+        except:
+            merge_queue.fail('merge')
+            raise
+        merge_queue.complete(['merge'], journal.DONE)
+        return True
+    finally:
+        merge_queue.close()
+
+def save_result_file(file_name, mode, writer, results, upload_key):
+    # Raises one of storage.STORAGE_ERRORS if the result cannot be saved.
+    if upload_key is not None:
+        writer.close(file_name)
+        result_storage.move(upload_key, file_name)
+        return
+    if writer is not None:
+        writer.close(file_name, args.output_format, args.parquet_compression, args.row_group_size)
+    elif args.output_format == 'parquet':
+        utils.write_parquet([results], file_name, mode, args.parquet_compression, args.row_group_size)
+    else:
+        results.to_csv(file_name, encoding='utf-8', index=False)
+    if args.aws_mode:
+        result_storage.put_file(file_name, file_name)
+        os.remove(file_name)
+
+def main(args, obj):
+    init_pacing()
+    init_page_cache()
+    init_watermarks()
+    init_user_index()
+    init_metrics()
+    if args.replay:
+        logger.info('Replay mode: every page is read from ' + args.page_cache_dir + '. No request is sent to Yelp.')
+    manager = None
+    if args.workers == 1:
+        manager = new_driver_manager()
+        manager.get()
+    # Load restaurant list file. Only the wanted rows and the columns the scrapers use are kept;
+    # from S3 the object is streamed instead of being read into memory first.
+    indices = None
+    if args.index_specified_mode:
+        indices = utils.load_specific_mode_file('index_list.txt')
+    elif args.page_specific_mode:
+        indices = [args.index_for_ps_mode]
+    source = obj if args.aws_mode else args.target_list_name + '.csv'
+    yelp_target_df, row_num = utils.load_targets(source, args.collected_object, args.min_index, args.max_index,
+                                                 indices, args.load_chunk_rows)
 
     object_name = ""
     if args.collected_object == 'profile':
-        if (not 'user_id' in yelp_target_df.columns) and (not 'userid' in yelp_target_df.columns):
+        if yelp_target_df is None:
             logger.error('Cannot find user_id column in your list file. The program will be terminated.')
             exit()
         object_name = "user"
     else:
-        if (not 'yelp_id' in yelp_target_df.columns) and (not 'yelpid' in yelp_target_df.columns):
-            logger.error('Cannot find yelp_id column in your list file. The program will be terminated.')
+        if yelp_target_df is None:
+            logger.error('Cannot find yelp_id, name or scrapedurl column in your list file. '
+                         'The program will be terminated.')
             exit()
         object_name = "restaurant"
 
 
 
     if args.index_specified_mode:
-        index_list = sorted(utils.load_specific_mode_file('index_list.txt'))
+        index_list = sorted(indices)
         list_of_page = []
-        if not utils.check_index_list(index_list, len(yelp_target_df) - 1):
+        if not set(index_list) <= set(yelp_target_df.index):
             logger.error('Check your index_list.txt. It may contains invalid indices. The program will be terminated.')
             exit()
 
@@ -827,13 +1703,13 @@ def main(args, obj):
         logger.info('Target index: {}, Start page index: {}, End page index: {}'.format(args.index_for_ps_mode, start_idx, end_idx))
 
     else:
-        # Check max index
+        # Check max index. The file has been read to the end only if it has no row past max index.
         if args.max_index == -1:
-            max_index = len(yelp_target_df) - 1
+            max_index = row_num - 1
         else:
-            if args.max_index > len(yelp_target_df) - 1:
-                logger.warning('Max index is too large. It is set to the last index ' + str(len(yelp_target_df) - 1) + '.')
-                max_index = len(yelp_target_df) - 1
+            if row_num != -1 and args.max_index > row_num - 1:
+                logger.warning('Max index is too large. It is set to the last index ' + str(row_num - 1) + '.')
+                max_index = row_num - 1
             else:
                 max_index = args.max_index
         index_list = list(range(args.min_index, max_index + 1, 1))
@@ -841,101 +1717,222 @@ def main(args, obj):
 
     if args.verbose:
         logger.info('The target list file has been successfully loaded.')
-        logger.info('The total number of ' + object_name + 's is ' + str(len(yelp_target_df)) + '.')
+        if row_num != -1:
+            logger.info('The total number of ' + object_name + 's is ' + str(row_num) + '.')
+        logger.info(str(len(yelp_target_df)) + ' ' + object_name + 's have been loaded.')
+
+    if user_index is not None and args.collected_object == 'profile':
+        # Skips the users scraped within the freshness window and the repeats of a user in the list.
+        user_ids = yelp_target_df.loc[index_list, 'userid'].astype(str).tolist()
+        fresh = user_index.fresh(set(user_ids), args.profile_fresh_days * 86400)
+        seen = set()
+        kept_list = []
+        for index, user_id in zip(index_list, user_ids):
+            if not user_id in fresh and not user_id in seen:
+                kept_list.append(index)
+            seen.add(user_id)
+        fresh_num = len([user_id for user_id in user_ids if user_id in fresh])
+        logger.info('{} users are skipped: {} have a fresh profile and {} are repeated in the list.'.format(
+            len(index_list) - len(kept_list), fresh_num, len(index_list) - len(kept_list) - fresh_num))
+        index_list = kept_list
+
+    # The targets of this run; the journal and the default queue are kept apart by it.
+    if args.index_specified_mode:
+        run_range = 'index_specified'
+    elif args.page_specific_mode:
+        run_range = 'page_specific:{}:{}'.format(args.index_for_ps_mode, args.part_for_ps_mode)
+    else:
+        run_range = '{}:{}'.format(args.min_index, max_index)
+    run_range = '{}:{}:{}'.format(args.collected_object, args.target_list_name, run_range)
+
+    global progress_journal
+    run_key = None
+    if args.journal_mode:
+        run_key = run_range
+        progress_journal = journal.ProgressJournal(args.journal_path, run_key)
+        states = progress_journal.states()
+        finished_list = [index for index in index_list if states.get(index) in [journal.DONE, journal.DELETED]]
+        if len(finished_list) > 0:
+            index_list = [index for index in index_list if not states.get(index) in [journal.DONE, journal.DELETED]]
+            logger.info('Resuming the previous run. {} finished '.format(len(finished_list)) + object_name +
+                        's are skipped.')
+        if not args.streaming_mode:
+            logger.info('Journal mode keeps the results on disk. Streaming mode is turned on.')
+            args.streaming_mode = 1
+
+    global lease_queue
+    if args.queue_mode:
+        queue_name = args.queue_name if args.queue_name != '' else run_range
+        lease_queue = leases.open_queue(args.queue_path, queue_name, args.node_id if args.node_id != '' else None,
+                                        args.lease_seconds, args.queue_max_attempts)
+        # A node keeps its ID when it is restarted; the leases of its previous run go back to the queue.
+        lease_queue.release()
+        # Another node may have filled the queue with targets this node has not loaded.
+        unknown_list = [task for task in lease_queue.tasks() if not int(task) in yelp_target_df.index]
+        if len(unknown_list) > 0:
+            logger.error('Queue ' + queue_name + ' has {} targets outside the list of this node (e.g. index {}). '
+                         'Every node of a queue needs the same target range. The program will be terminated.'.format(
+                         len(unknown_list), unknown_list[0]))
+            exit()
+        lease_queue.populate(index_list)
+        logger.info('Queue ' + queue_name + ': ' + ', '.join(
+            ['{} {}'.format(n, state) for state, n in sorted(lease_queue.counts().items())]) +
+            '. This node is ' + lease_queue.owner + '.')
+        if not args.streaming_mode:
+            logger.info('Queue mode completes targets once they are on disk. Streaming mode is turned on.')
+            args.streaming_mode = 1
 
     target_obj_num = len(index_list)
-    yelp_target_df = yelp_target_df.loc[index_list]
+    # One record per target, in the order of index_list, built once for the whole run. A queue node
+    # keeps every loaded target: another node may put in ones this node has skipped (e.g. fresh users).
+    targets = yelp_target_df.loc[index_list].to_dict('index') if not args.queue_mode else \
+        yelp_target_df.to_dict('index')
+    del yelp_target_df
     if args.verbose:
         logger.info('The number of target ' + object_name + 's is ' + str(target_obj_num))
 
     start = timer()
     required_info_dict = {}
     if args.collected_object == 'profile':
-        cdt_id_name_list = ['thankYou', 'justANote', 'greatPhoto', 'goodWriter', 'ilikeYourProfile', 'justANote',
-                            'writeMore', 'youAreCool', 'cutePic', 'greatList', 'youAreFunny', 'hotStuff']
-        me_list = ['Location', 'Yelping since', 'Things I Love', 'Find Me In', 'My Hometown', 'My Blog Or Website',
-                   'When I’m Not Yelping...', 'Why You Should Read My Reviews', 'My Second Favorite Website',
-                   'The Last Great Book I Read', 'My First Concert', 'My Favorite Movie', 'My Last Meal On Earth',
-                   'Don’t Tell Anyone Else But...', 'Most Recent Discovery', 'Current Crush']
-        required_info_dict['cdt_id_name'] = cdt_id_name_list
-        required_info_dict['about_me'] = me_list
-
+        required_info_dict['cdt_id_name'] = utils.COMPLIMENT_IDS
+        required_info_dict['about_me'] = utils.ABOUT_ME_TITLES
+
+    collected_objects = {'profile': profiles, 'review': reviews, 'restaurant': restaurants}[args.collected_object]
+    writer = None
+    upload_key = None
+    # Nodes of a queue run may share a directory or a bucket; each one writes its own files.
+    node_suffix = '' if lease_queue is None else '_' + safe_name(lease_queue.owner)
+    parts_prefix = None
+    if args.streaming_mode:
+        upload = None
+        publish = None
+        if lease_queue is not None:
+            # Every chunk is put in the result storage (S3 in AWS mode) before its targets are
+            # completed in the queue, so the work of a node that dies is never lost. The part
+            # names carry the node and the start of its run, which a restarted node cannot reuse.
+            parts_prefix = 'yelp_' + args.collected_object + '_parts_' + safe_name(lease_queue.queue_name) + '/'
+            part_key = parts_prefix + safe_name(lease_queue.owner) + '-' + datetime.now().strftime('%Y%m%d%H%M%S') + \
+                '-{}'
+            publish = lambda path: result_storage.put_file(part_key.format(os.path.basename(path)), path)
+        elif args.aws_mode and args.output_format == 'csv':
+            # The final name depends on how the run ends, so chunks go to a staging key that is
+            # renamed once the upload is complete. An upload of this key left by a crashed run is
+            # aborted first; the key names the run, so no other run's upload is touched.
+            upload_key = 'yelp_' + args.collected_object + '_upload_' + safe_name(run_range) + node_suffix + \
+                         '.csv.partial'
+            abort_uploads(upload_key)
+            upload = result_storage.open_upload(upload_key)
+        # The parts of a run are kept apart by its range; they are reused only when the journal
+        # resumes the run.
+        writer = writers.StreamingWriter(args.collected_object, 'yelp_' + args.collected_object + '_parts_' +
+                                         safe_name(run_range) + node_suffix, args.chunk_size, upload, publish,
+                                         progress_journal is not None)
+
+    global profile_stage
+    profile_writer = None
+    profile_upload_key = None
+    if args.pipeline_mode:
+        if args.streaming_mode:
+            upload = None
+            if args.aws_mode and args.output_format == 'csv':
+                profile_upload_key = 'yelp_profile_upload_' + safe_name(run_range) + node_suffix + '.csv.partial'
+                abort_uploads(profile_upload_key)
+                upload = result_storage.open_upload(profile_upload_key)
+            # Profiles are not journaled, so parts of an earlier run are never reused.
+            profile_writer = writers.StreamingWriter('profile', 'yelp_profile_parts_' + safe_name(run_range) +
+                                                     node_suffix, args.chunk_size, upload)
+        profile_stage = ProfileStage(profile_writer)
+        logger.info('Pipeline mode: the profiles of new reviewers are scraped while the reviews are collected.')
+
+    if args.workers > 1:
+        run_workers(targets, required_info_dict, run_key, writer, collected_objects)
+        index_list = []
+    elif args.queue_mode:
+        target_obj_num = run_queue(manager, targets, list_of_page, required_info_dict, writer,
+                                   collected_objects)
+        index_list = []
+
+    work = scheduler.WorkScheduler(index_list)
     while(True):
-        global success_num, fail_num
-        if len(index_list) == 0:
+        index = work.next()
+        if index is None:
             break
 
+        index_start = timer()
         try:
-            for index, object in yelp_target_df.iterrows():
-                if args.collected_object == 'profile':
-                    reset_configuration = profile_scraper(driver, index, object, required_info_dict)
-                    if reset_configuration:
-                        chrome_options = webdriver.ChromeOptions()
-                        driver.set_page_load_timeout(10)
-                        if platform.system() != 'Windows' or args.open_chrome == 0:
-                            chrome_options.add_argument('--headless')
-                            chrome_options.add_argument('--no-sandbox')
-                            chrome_options.add_argument('--disable-dev-shm-usage')
-                        chrome_options.add_argument('log-level=3')
-
-                        driver = webdriver.Chrome(options=chrome_options)
-                        stealth(driver,
-                                languages=["en-US", "en"],
-                                vendor="Google Inc.",
-                                platform="Win32",
-                                webgl_vendor="Intel Inc.",
-                                renderer="Intel Iris OpenGL Engine",
-                                fix_hairline=True,
-                                )
-                elif args.collected_object == 'review':
-                    review_scraper(driver, index, object, list_of_page)
-                else:
-                    res_scraper(driver, index, object)
-                success_num += 1
-                index_list.pop(0)
+            scrape_object(manager, index, targets[index], list_of_page, required_info_dict)
+            store_result(writer, collected_objects, index)
+            write_index_metrics(index, journal.DONE, timer() - index_start)
         except:
-            fail_num += 1
-            error_index = index_list.pop(0)
-            if not error_index in invalid_object_list:
-                fail_list.append(error_index)
             logger.error(sys.exc_info()[0])
             logger.error(traceback.format_exc())
-            logger.error('Index ' + str(error_index) +': Error occured. This ' + object_name + ' gets skipped.')
-            if len(index_list) > 0:
-                yelp_target_df = yelp_target_df.loc[index_list]
+            failure = failure_class(sys.exc_info()[1], index)
+            delay = schedule_retry(index, failure)
+            if delay is not None:
+                write_index_metrics(index, 'retry', timer() - index_start)
+                logger.warning('Index {}: {} failure. Retry {}/{} in {:.0f}s.'.format(
+                    index, failure, retry_attempts[index], args.max_retries, delay))
+                if failure == BLOCKED:
+                    # Every target would be blocked too; the whole run waits.
+                    time.sleep(delay)
+                    delay = 0
+                work.retry(index, delay)
+                continue
+            record_failure(index)
+            write_index_metrics(index, journal.DELETED if index in invalid_object_list else journal.FAILED,
+                                timer() - index_start)
+            logger.error('Index ' + str(index) +': Error occured. This ' + object_name + ' gets skipped.')
+
+    if profile_stage is not None:
+        profile_stage.close()
+    if manager is not None:
+        manager.quit()
+    close_page_managers()
+    if page_cache is not None:
+        page_cache.close()
+    write_run_metrics()
 
     logger.info('-----------------')
     logger.info('Report')
     logger.info('Total Number of Targets: ' + str(target_obj_num))
     logger.info('Success: ' + str(success_num))
     logger.info('Fail: ' + str(fail_num))
+    if retry_num > 0:
+        retried_num = len(set([key[0] if isinstance(key, tuple) else key for key in retry_attempts]))
+        logger.info('Retries: {} ({} '.format(retry_num, retried_num) + object_name + 's retried)')
     if fail_num > 0:
         msg = ", ".join(map(str, fail_list))
         if len(fail_list) > 0:
             logger.info('Failed Indexs: ' + msg)
-            bytes_data = msg.encode()
-            fail_list_name = 'failed-index-list-{}.txt'.format(datetime.now().strftime('%Y_%m_%d-%I_%M_%S_%p'))
-            s3.put_object(Bucket=args.bucket_name, Key=fail_list_name, Body=bytes_data)
+            if args.aws_mode or args.save_failed_list:
+                fail_list_name = 'failed-index-list-{}.txt'.format(datetime.now().strftime('%Y_%m_%d-%I_%M_%S_%p'))
+                result_storage.put_bytes(fail_list_name, msg.encode())
         if len(invalid_object_list) > 0:
             msg2 = ', '.join(map(str, invalid_object_list))
-            bytes_data = msg2.encode()
-            deleted_list_name = 'deleted-index-list-{}.txt'.format(datetime.now().strftime('%Y_%m_%d-%I_%M_%S_%p'))
-            s3.put_object(Bucket=args.bucket_name, Key=deleted_list_name, Body=bytes_data)
+            if args.aws_mode or args.save_failed_list:
+                deleted_list_name = 'deleted-index-list-{}.txt'.format(datetime.now().strftime('%Y_%m_%d-%I_%M_%S_%p'))
+                result_storage.put_bytes(deleted_list_name, msg2.encode())
             logger.info('The following ' + object_name + ' profiles has been removed: ' + msg2)
     logger.info('-----------------')
 
-    if success_num == 0:
+    saved_num = success_num
+    failed_num = fail_num
+    if lease_queue is not None:
+        # A queue run saves one file with the targets of every node.
+        counts = lease_queue.counts()
+        saved_num = counts.get(journal.DONE, 0)
+        failed_num = counts.get(journal.FAILED, 0) + counts.get(journal.DELETED, 0)
+    if saved_num == 0 and (writer is None or len(writer.finalized_parts()) == 0) and \
+            (parts_prefix is None or len(result_storage.list(parts_prefix)) == 0):
         logger.info('Nothing to save because NO DATA HAVE BEEN COLLECTED :(')
+        if writer is not None:
+            writer.close()
 
     else:
         logger.info('Saving the result...')
-        global reviews, profiles, restaurants
-        if args.collected_object == 'profile':
-            results = utils.set_to_df(profiles, 'profile')
-        elif args.collected_object == 'review':
-            results = utils.set_to_df(reviews, 'review')
-        else:
-            results = utils.set_to_df(restaurants, 'restaurant')
+        results = None
+        if writer is None:
+            results = utils.set_to_df(collected_objects, args.collected_object)
 
         if args.collected_object == 'profile':
             file_name = 'yelp_profile.csv'
@@ -947,15 +1944,15 @@ def main(args, obj):
         if args.index_suffix:
             if args.index_specified_mode:
                 if args.collected_object == 'profile':
-                    file_name = 'yelp_profile_index_specified (' + str(success_num) + ' of ' + str(target_obj_num) + ' users).csv'
+                    file_name = 'yelp_profile_index_specified (' + str(saved_num) + ' of ' + str(target_obj_num) + ' users).csv'
                 elif args.collected_object == 'review':
-                    file_name = 'yelp_review_index_specified (' + str(success_num) + ' of ' + str(target_obj_num) + ' reviews).csv'
+                    file_name = 'yelp_review_index_specified (' + str(saved_num) + ' of ' + str(target_obj_num) + ' reviews).csv'
                 else:
-                    file_name = 'yelp_res_info_index_specified (' + str(success_num) + ' of ' + str(target_obj_num) + ' reviews).csv'
+                    file_name = 'yelp_res_info_index_specified (' + str(saved_num) + ' of ' + str(target_obj_num) + ' reviews).csv'
             elif args.page_specific_mode:
                 file_name = 'yelp_review_page_specified (from ' + str(start_idx) + ' to ' + str(end_idx) + ' of ' + str(args.index_for_ps_mode) + ' reviews).csv'
             else:
-                if fail_num == 0:
+                if failed_num == 0:
                     if args.collected_object == 'profile':
                         file_name = 'yelp_profile_from_' + str(args.min_index) + '_to_' + str(max_index) + '.csv'
                     elif args.collected_object == 'review':
@@ -965,29 +1962,64 @@ def main(args, obj):
                 else:
                     if args.collected_object == 'profile':
                         file_name = 'yelp_profile_from_' + str(args.min_index) + '_to_' + str(max_index) + \
-                                    ' (' + str(fail_num) + ' fails).csv'
+                                    ' (' + str(failed_num) + ' fails).csv'
                     elif args.collected_object == 'review':
                         file_name = 'yelp_review_from_' + str(args.min_index) + '_to_' + str(max_index) + \
-                                ' (' + str(fail_num) + ' fails).csv'
+                                ' (' + str(failed_num) + ' fails).csv'
                     else:
                         file_name = 'yelp_res_info_' + str(args.min_index) + '_to_' + str(max_index) + \
-                                ' (' + str(fail_num) + ' fails).csv'
+                                ' (' + str(failed_num) + ' fails).csv'
+        file_name = file_name[:-len('.csv')] + ('.parquet' if args.output_format == 'parquet' else '.csv')
         end = timer()
-        if args.aws_mode:
-            with io.StringIO() as csv_buffer:
-                results.to_csv(csv_buffer, index=False)
-                response = s3.put_object(Bucket=args.bucket_name, Key=file_name, Body=csv_buffer.getvalue())
-                status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
-                if status == 200:
-                    logger.info(
-                        'Done. All work you requested has been finished. The program will be terminated.')
+        if writer is not None:
+            finalize_results(writer)
+        try:
+            if lease_queue is not None:
+                writer.close()
+                if merge_queue_parts(parts_prefix, file_name):
+                    logger.info('The results of every node have been saved to ' + result_storage.location(file_name))
                 else:
-                    logger.error('Failed to save the result file to your S3 bucket.')
-        else:
-            results.to_csv(file_name, encoding='utf-8', index=False)
-            logger.info('Done. All work you requested has been finished. The program will be terminated.')
+                    logger.info('Done. The results of the queue are saved by another node.')
+            else:
+                save_result_file(file_name, args.collected_object, writer, results, upload_key)
+                # Without streaming the results are only safe once the result file is saved.
+                results_stored(list(collected_objects.keys()))
+                logger.info('Done. All work you requested has been finished. The program will be terminated.')
+                logger.info('The result has been saved to ' + result_storage.location(file_name))
+        except storage.STORAGE_ERRORS:
+            logger.error(traceback.format_exc())
+            logger.error('Failed to save the result file to ' + result_storage.location(file_name) + '.')
         logger.info('Total Elapsed Time: ' + str(timedelta(seconds=(end - start))))
 
+    if profile_stage is not None:
+        logger.info('Profile stage: {} profiles have been collected. {} failed, {} deleted.'.format(
+            len(profile_stage.scraped), len(profile_stage.fail_list), len(profile_stage.deleted_list)))
+        if len(profile_stage.fail_list) > 0:
+            logger.info('Failed Users: ' + ', '.join(profile_stage.fail_list))
+        profile_file_name = 'yelp_profile_pipeline' + node_suffix + \
+                            ('.parquet' if args.output_format == 'parquet' else '.csv')
+        if len(profile_stage.scraped) == 0:
+            if profile_writer is not None:
+                profile_writer.close()
+        else:
+            try:
+                results = None
+                if profile_writer is None:
+                    results = utils.set_to_df(profile_stage.results, 'profile')
+                save_result_file(profile_file_name, 'profile', profile_writer, results, profile_upload_key)
+                if user_index is not None:
+                    user_index.mark_scraped(profile_stage.scraped)
+                logger.info('The profiles have been saved to ' + result_storage.location(profile_file_name))
+            except storage.STORAGE_ERRORS:
+                logger.error(traceback.format_exc())
+                logger.error('Failed to save the profiles to ' + result_storage.location(profile_file_name) + '.')
+    if lease_queue is not None:
+        lease_queue.close()
+    if watermark_store is not None:
+        watermark_store.close()
+    if user_index is not None:
+        user_index.close()
+
 if __name__ == '__main__':
     parser_error = False
     # args check
@@ -1021,6 +2053,86 @@ if __name__ == '__main__':
         parser_error = True
         parser.error('Wait time for next page cannot be negative.')
 
+    if args.adaptive_pacing and not (0 <= args.min_wait_time <= args.max_wait_time):
+        parser_error = True
+        parser.error('Min wait time must be non-negative and not larger than max wait time.')
+
+    if args.page_concurrency < 1:
+        parser_error = True
+        parser.error('Page concurrency must be at least 1.')
+
+    if args.load_chunk_rows < 1:
+        parser_error = True
+        parser.error('Target list chunks must have at least one row.')
+
+    if args.max_retries < 0 or args.retry_base_delay < 0 or args.retry_budget < 0 or args.blocked_cooldown < 0:
+        parser_error = True
+        parser.error('Retry options cannot be negative.')
+
+    if args.workers < 1:
+        parser_error = True
+        parser.error('The number of workers must be at least 1.')
+
+    if args.queue_mode and (args.workers > 1 or args.page_specific_mode):
+        parser_error = True
+        parser.error('Queue mode runs one scraper per node and cannot be combined with workers or page specific mode.')
+
+    if args.queue_mode and args.queue_path.startswith('redis') and leases.redis is None:
+        parser_error = True
+        parser.error('A Redis queue needs the redis package. Install it or use a SQLite file as --queue_path.')
+
+    if args.queue_mode and not (0 < args.heartbeat_seconds < args.lease_seconds):
+        parser_error = True
+        parser.error('Heartbeats must be sent more often than leases expire.')
+
+    if args.incremental_mode and (args.collected_object != 'review' or args.page_specific_mode):
+        parser_error = True
+        parser.error('Incremental mode collects the new reviews of whole businesses and needs review mode.')
+
+    if args.incremental_mode and args.page_concurrency > 1:
+        parser_error = True
+        parser.error('Incremental mode loads the pages in order to stop early and cannot use page concurrency.')
+
+    if args.split_page_threshold > 0 and (args.collected_object != 'review' or args.workers == 1 or
+                                          args.incremental_mode):
+        parser_error = True
+        parser.error('Splitting businesses spreads their pages over the workers and needs review mode with '
+                     'several workers, without incremental mode.')
+
+    if args.split_chunk_pages < 1:
+        parser_error = True
+        parser.error('Work units must have at least one page.')
+
+    if args.pipeline_mode and args.collected_object != 'review':
+        parser_error = True
+        parser.error('Pipeline mode scrapes the profiles of reviewers and needs review mode.')
+
+    if args.workers > 1 and args.page_specific_mode:
+        parser_error = True
+        parser.error('Page specific mode works on a single index and cannot use multiple workers.')
+
+    if args.block_resources and any([t.strip() not in resource_blocking.RESOURCE_TYPE_PATTERNS
+                                     for t in args.blocked_resource_types.split(',') if t.strip() != '']):
+        parser_error = True
+        parser.error('Blocked resource types must be among ' +
+                     ', '.join(resource_blocking.RESOURCE_TYPE_PATTERNS.keys()) + '.')
+
+    if args.replay and not os.path.exists(os.path.join(args.page_cache_dir, 'index.db')):
+        parser_error = True
+        parser.error('Replay mode needs --page_cache_dir pointing to an existing page cache.')
+
+    if args.output_format == 'parquet' and utils.pa is None:
+        parser_error = True
+        parser.error('Parquet output needs pyarrow. Install it or use --output_format csv.')
+
+    if args.aws_mode and args.upload_part_mb < 5:
+        parser_error = True
+        parser.error('S3 upload parts must be at least 5 MB.')
+
+    if args.row_group_size < 1:
+        parser_error = True
+        parser.error('Row group size must be at least 1.')
+
     if parser_error:
         logger.error('Some arguments you entered are not valid.')
         exit()
@@ -1030,17 +2142,19 @@ if __name__ == '__main__':
     if args.aws_mode:
             prefix = args.target_list_name + '.csv'
             try:
-                s3 = boto3.client('s3')
+                result_storage = storage.S3Storage(args.bucket_name, part_size=args.upload_part_mb * 1024 * 1024,
+                                                   logger=logger)
             except:
                 print('Cannot access your AWS S3 service. Check your IAM role.')
                 exit()
             else:
                 try:
-                    obj = s3.get_object(Bucket=args.bucket_name, Key=prefix)
+                    obj = result_storage.open_read(prefix)
                 except:
                     print('Your S3 bucket name is not corret or ' + args.target_list_name + '.csv cannot be found. The program will be terminated.')
                     exit()
     else:
+        result_storage = storage.LocalStorage()
         if not os.path.exists(args.target_list_name + '.csv'):
             print(args.target_list_name + '.csv cannot be found. The program will be terminated.')
             exit()